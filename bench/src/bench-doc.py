@@ -0,0 +1,121 @@
+# vim: set ts=4 sts=0 sw=4 si fenc=utf-8 et:
+# vim: set fdm=marker fmr={{{,}}} fdl=0 foldcolumn=4:
+# Authors:     BP
+# =========================================
+
+# ---- dependencies {{{
+import argparse
+import json
+import logging
+import sys
+import tempfile
+import time
+from sys import stdout
+
+sys.path.append("../templates")
+sys.path.append("../compose-daily/src")
+from doc import Doc, from_json
+
+# }}}
+
+# Doc sizes (lines) to build; each is 10x the last, so linear means ~10x the time
+SIZES = [1000, 10000, 100000]
+# per-line cost may grow this much from the smallest Doc to the biggest
+# before it counts as not linear (caches, GC and json don't scale perfectly)
+MAX_GROWTH = 3.0
+
+
+# ---- support methods {{{
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--max-growth", type=float, default=MAX_GROWTH)
+    parser.add_argument("--output", default=None)
+    return parser.parse_args()
+
+
+def get_logger(sname, file_name=None):
+    logger = logging.getLogger(sname)
+    logger.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        "%(asctime)s - %(levelname)s " + "- %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
+    )
+    stream_handler = logging.StreamHandler(stdout)
+    stream_handler.setFormatter(formatter)
+    logger.addHandler(stream_handler)
+    if file_name:
+        file_handler = logging.FileHandler(file_name)
+        file_handler.setFormatter(formatter)
+        logger.addHandler(file_handler)
+    return logger
+
+
+def build(n):
+    """
+    what the composers do: a header, then one insert per line, checking len() as they go
+    """
+    notes = Doc(prefix="# ", text="2025-01-08", path="/tmp/2025-01-08.md")
+    for i in range(n - 1):
+        notes.insert(prefix="- [ ] ", text=f"meeting {i}")
+        assert len(notes) == i + 2
+    return notes
+
+
+def build_sections(n, sections=10):
+    """
+    stages filling sections out of order: each line goes to the end
+    of one of `sections` sections, round robin, most of them mid-Doc
+    """
+    notes = Doc(prefix="# ", text="2025-01-08", path="/tmp/2025-01-08.md")
+    names = [f"section {i}" for i in range(sections)]
+    for name in names:
+        notes.insert(prefix="# ", text=name)
+    for i in range(n - sections - 1):
+        notes.insert_into(names[i % sections], prefix="- [ ] ", text=f"task {i}")
+    assert len(notes) == n
+    return notes
+
+
+def bench_size(n, jsonfile):
+    start = time.perf_counter()
+    notes = build(n)
+    built = time.perf_counter()
+    notes.to_json(jsonfile)
+    written = time.perf_counter()
+    assert len(from_json(jsonfile)) == n
+    read = time.perf_counter()
+    build_sections(n)
+    filled = time.perf_counter()
+    return {
+        "build_s": round(built - start, 4),
+        "to_json_s": round(written - built, 4),
+        "from_json_s": round(read - written, 4),
+        "insert_into_s": round(filled - read, 4),
+        "us_per_line": round((filled - start) / n * 1e6, 3),
+    }
+
+
+# }}}
+
+# ---- main {{{
+if __name__ == "__main__":
+    args = get_args()
+    logger = get_logger(__name__)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for n in args.sizes:
+            results[n] = bench_size(n, f"{tmpdir}/doc.json")
+            logger.info(f"{n} lines: {results[n]}")
+    smallest, biggest = min(args.sizes), max(args.sizes)
+    growth = results[biggest]["us_per_line"] / results[smallest]["us_per_line"]
+    logger.info(f"per-line cost x{growth:.2f} from {smallest} to {biggest} lines")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+    if growth > args.max_growth:
+        logger.info(f"FAILED: Doc isn't scaling linearly (x{growth:.2f})")
+        sys.exit(1)
+    logger.info("done.")
+
+# }}}
+# done.
@@ -0,0 +1,180 @@
+# vim: set ts=4 sts=0 sw=4 si fenc=utf-8 et:
+# vim: set fdm=marker fmr={{{,}}} fdl=0 foldcolumn=4:
+# Authors:     BP
+# =========================================
+
+# ---- dependencies {{{
+import argparse
+import importlib.util
+import json
+import logging
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from sys import stdout
+
+
+sys.path.append("../import/src")
+sys.path.append("../templates")
+from extract import iter_todo_lines, line_records, to_frame
+from grammar import from_rules
+from sources import find_sources
+from taskindex import connect, index_path
+
+# }}}
+
+IMPORTER = "../import/src/import.py"
+
+
+# ---- support methods {{{
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vault", default=None)
+    parser.add_argument("--rules", default="../templates/rules.yml")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--name", default=None)
+    args = parser.parse_args()
+    assert Path(args.vault).is_dir()
+    assert Path(args.rules).exists()
+    assert args.output
+    return args
+
+
+def get_logger(sname, file_name=None):
+    logger = logging.getLogger(sname)
+    logger.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        "%(asctime)s - %(levelname)s " + "- %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
+    )
+    stream_handler = logging.StreamHandler(stdout)
+    stream_handler.setFormatter(formatter)
+    logger.addHandler(stream_handler)
+    if file_name:
+        file_handler = logging.FileHandler(file_name)
+        file_handler.setFormatter(formatter)
+        logger.addHandler(file_handler)
+    return logger
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux (bytes on macOS)
+    scale = 1 << 20 if sys.platform == "darwin" else 1 << 10
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def timed(stage, func, *args):
+    """
+    run one stage, returning its result and {wall_s, peak_rss_mb}.
+    the RSS is the high-water mark of the process so far,
+    which is why every vault gets benchmarked in its own process
+    """
+    start = time.perf_counter()
+    out = func(*args)
+    wall = time.perf_counter() - start
+    stats = {"wall_s": round(wall, 4), "peak_rss_mb": round(peak_rss_mb(), 1)}
+    logger.info(f"{stage}: {stats['wall_s']:.3f}s, peak RSS {stats['peak_rss_mb']} MB")
+    return out, stats
+
+
+def load_importer():
+    """
+    import.py as a module (its name is a keyword, so it can't be imported
+    as it is). its functions read args, logger and index from the module,
+    which write_stage sets the way import.py's main would
+    """
+    spec = importlib.util.spec_from_file_location("importer", IMPORTER)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.logger = logger
+    return module
+
+
+def read_stage(paths):
+    return [(str(path), list(iter_todo_lines(path))) for path in paths]
+
+
+def extract_stage(lines, grammar):
+    records = (
+        record
+        for source, numbered in lines
+        for record in line_records(source, numbered, grammar)
+    )
+    return to_frame(records, columns=importer.TASK_COLS)
+
+
+def write_stage(notes, taskdir):
+    """
+    import.py's prep_tasks + write_tasks for a first import into `taskdir`,
+    with import.py's default options
+    """
+    importer.args = argparse.Namespace(
+        taskdir=taskdir, by_month=False, compact=False, max_parts=8
+    )
+    importer.index = connect(index_path(taskdir))
+    tables = importer.prep_tasks(notes)
+    importer.write_tasks(tables, [])
+    importer.index.close()
+    nbytes = sum(path.stat().st_size for path in Path(taskdir).rglob("*.parquet"))
+    return sum(rows.shape[0] for rows in tables.values()), nbytes
+
+
+def run_bench(vault, grammar):
+    stages = {}
+    paths, stages["walk"] = timed("walk", find_sources, vault)
+    lines, stages["read"] = timed("read", read_stage, paths)
+    notes, stages["extract"] = timed("extract", extract_stage, lines, grammar)
+    with tempfile.TemporaryDirectory() as taskdir:
+        (nstored, nbytes), stages["write"] = timed("write", write_stage, notes, taskdir)
+    nrows = notes.shape[0]
+    wall = sum(stage["wall_s"] for stage in stages.values())
+    for stage in stages.values():
+        stage["rows_per_s"] = round(nrows / max(stage["wall_s"], 1e-9), 1)
+    return {
+        "files": len(paths),
+        "todo_lines": sum(len(numbered) for _, numbered in lines),
+        "rows": nrows,
+        "stored_rows": nstored,
+        "stored_mb": round(nbytes / (1 << 20), 2),
+        "stages": stages,
+        "total": {
+            "wall_s": round(wall, 4),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "rows_per_s": round(nrows / max(wall, 1e-9), 1),
+        },
+    }
+
+
+def update_results(fname, name, result):
+    """
+    one JSON file holds every vault's numbers, keyed by vault name
+    """
+    results = {}
+    if Path(fname).exists():
+        with open(fname, "r") as f:
+            results = json.load(f)
+    results[name] = result
+    with open(fname, "w") as f:
+        json.dump(results, f, sort_keys=True, indent=1)
+    return 1
+
+
+# }}}
+
+# ---- main {{{
+if __name__ == "__main__":
+    args = get_args()
+    logger = get_logger(__name__)
+    importer = load_importer()
+    name = args.name if args.name else Path(args.vault).name
+    logger.info(f"benchmarking import stages over {args.vault}")
+    result = run_bench(args.vault, from_rules(args.rules))
+    logger.info(
+        f"{result['rows']} TODO records from {result['files']} files "
+        f"in {result['total']['wall_s']:.3f}s ({result['total']['rows_per_s']} rows/s)"
+    )
+    update_results(args.output, name, result)
+
+# }}}
+# done.
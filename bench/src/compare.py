@@ -0,0 +1,119 @@
+# vim: set ts=4 sts=0 sw=4 si fenc=utf-8 et:
+# vim: set fdm=marker fmr={{{,}}} fdl=0 foldcolumn=4:
+# Authors:     BP
+# =========================================
+
+# ---- dependencies {{{
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+from sys import stdout
+
+# }}}
+
+# timings shorter than this are mostly noise, so they're never called regressions
+MIN_WALL_S = 0.05
+
+
+# ---- support methods {{{
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--current", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--rss-tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+    assert Path(args.baseline).exists()
+    assert Path(args.current).exists()
+    return args
+
+
+def get_logger(sname, file_name=None):
+    logger = logging.getLogger(sname)
+    logger.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        "%(asctime)s - %(levelname)s " + "- %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
+    )
+    stream_handler = logging.StreamHandler(stdout)
+    stream_handler.setFormatter(formatter)
+    logger.addHandler(stream_handler)
+    if file_name:
+        file_handler = logging.FileHandler(file_name)
+        file_handler.setFormatter(formatter)
+        logger.addHandler(file_handler)
+    return logger
+
+
+def read_json(fname):
+    with open(fname, "r") as f:
+        out = json.load(f)
+    return out
+
+
+def compare_stage(label, old, new, tolerance, rss_tolerance):
+    """
+    returns the regressions found in one stage as messages
+    """
+    found = []
+    if (new["wall_s"] > old["wall_s"] * (1 + tolerance)) & (
+        new["wall_s"] - old["wall_s"] > MIN_WALL_S
+    ):
+        found.append(f"{label} wall time {old['wall_s']:.3f}s -> {new['wall_s']:.3f}s")
+    if new["peak_rss_mb"] > old["peak_rss_mb"] * (1 + rss_tolerance):
+        found.append(
+            f"{label} peak RSS {old['peak_rss_mb']} MB -> {new['peak_rss_mb']} MB"
+        )
+    return found
+
+
+def compare(baseline, current, tolerance, rss_tolerance):
+    regressions = []
+    for name, new in sorted(current.items()):
+        old = baseline.get(name)
+        if old is None:
+            logger.info(f"{name}: not in the baseline, skipping")
+            continue
+        if old["rows"] != new["rows"]:
+            logger.info(f"WARNING: {name} rows {old['rows']} -> {new['rows']}")
+        for stage, stats in new["stages"].items():
+            if stage in old["stages"]:
+                regressions += compare_stage(
+                    f"{name} {stage}",
+                    old["stages"][stage],
+                    stats,
+                    tolerance,
+                    rss_tolerance,
+                )
+        regressions += compare_stage(
+            f"{name} total", old["total"], new["total"], tolerance, rss_tolerance
+        )
+        change = new["total"]["wall_s"] / max(old["total"]["wall_s"], 1e-9) - 1
+        logger.info(
+            f"{name}: {old['total']['wall_s']:.3f}s -> {new['total']['wall_s']:.3f}s "
+            f"({change:+.0%})"
+        )
+    return regressions
+
+
+# }}}
+
+# ---- main {{{
+if __name__ == "__main__":
+    args = get_args()
+    logger = get_logger(__name__)
+    regressions = compare(
+        read_json(args.baseline),
+        read_json(args.current),
+        args.tolerance,
+        args.rss_tolerance,
+    )
+    for regression in regressions:
+        logger.info(f"REGRESSION: {regression}")
+    if regressions:
+        sys.exit(1)
+    logger.info("no regressions against the baseline")
+
+# }}}
+# done.
@@ -0,0 +1,124 @@
+# vim: set ts=4 sts=0 sw=4 si fenc=utf-8 et:
+# vim: set fdm=marker fmr={{{,}}} fdl=0 foldcolumn=4:
+# Authors:     BP
+# =========================================
+
+# ---- dependencies {{{
+import argparse
+import logging
+import random
+from datetime import date, timedelta
+from pathlib import Path
+from sys import stdout
+
+# }}}
+
+# pieces for lines that look like demo/hand/code-review.md
+VERBS = ["add", "fix", "review", "rename", "document", "drop", "test", "refactor"]
+THINGS = [
+    "import Makefile targets",
+    "initial_asserts()",
+    "the clean.py format_str()",
+    "short functions advice",
+    "logical_missing.yaml",
+    "lines 97-106 as a function",
+    "the training doc",
+    "final_asserts()",
+]
+TIMELINES = ["[by friday]", "[before 2025-03-01]", "[on monday]", "[by EOD]"]
+NOTES = [
+    "what does the code do?",
+    "what could the code do better?",
+    "variable or file names that could be more intuitive?",
+    "should Makefile use sample_state.R output?",
+    "cleaning unstructured text fields",
+]
+
+
+# ---- support methods {{{
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--lines", type=int, default=10000)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--density", type=float, default=0.2)
+    parser.add_argument("--tags", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    assert args.output
+    assert 0 <= args.density <= 1
+    assert (args.lines > 0) & (args.files > 0) & (args.tags > 0)
+    return args
+
+
+def get_logger(sname, file_name=None):
+    logger = logging.getLogger(sname)
+    logger.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        "%(asctime)s - %(levelname)s " + "- %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
+    )
+    stream_handler = logging.StreamHandler(stdout)
+    stream_handler.setFormatter(formatter)
+    logger.addHandler(stream_handler)
+    if file_name:
+        file_handler = logging.FileHandler(file_name)
+        file_handler.setFormatter(formatter)
+        logger.addHandler(file_handler)
+    return logger
+
+
+def todo_line(rng, ntags):
+    tags = " ".join(
+        f"(project-{rng.randrange(ntags)})" for _ in range(rng.choice([0, 1, 1, 1, 2]))
+    )
+    timeline = rng.choice(TIMELINES) if rng.random() < 0.1 else ""
+    task = f"{rng.choice(VERBS)} {rng.choice(THINGS)}"
+    return " ".join(part for part in ["- TODO:", tags, task, timeline] if part)
+
+
+def note_line(rng, lineno):
+    if lineno % 25 == 0:
+        return f"#### {rng.choice(VERBS)}"
+    return f"- {rng.choice(NOTES)}"
+
+
+def write_vault(output, nlines, nfiles, density, ntags, seed):
+    """
+    `nlines` lines spread evenly over `nfiles` daily notes (named by date,
+    so --by-month has something to split on), `density` of them TODOs
+    """
+    rng = random.Random(seed)
+    Path(output).mkdir(parents=True, exist_ok=True)
+    start = date(2023, 1, 1)
+    per_file, extra = divmod(nlines, nfiles)
+    ntodo = 0
+    for i in range(nfiles):
+        lines = []
+        for lineno in range(per_file + (i < extra)):
+            if rng.random() < density:
+                lines.append(todo_line(rng, ntags))
+                ntodo += 1
+            else:
+                lines.append(note_line(rng, lineno))
+        day = start + timedelta(days=i)
+        with open(f"{output}/{day.isoformat()}.md", "w") as f:
+            f.write("\n".join(lines) + "\n")
+    return ntodo
+
+
+# }}}
+
+# ---- main {{{
+if __name__ == "__main__":
+    args = get_args()
+    logger = get_logger(__name__)
+    ntodo = write_vault(
+        args.output, args.lines, args.files, args.density, args.tags, args.seed
+    )
+    logger.info(
+        f"{args.lines} lines ({ntodo} TODOs, {args.tags} tags) "
+        f"in {args.files} notes written to {args.output}"
+    )
+
+# }}}
+# done.
@@ -13,7 +13,6 @@ from sys import stdout
 from zoneinfo import ZoneInfo
 
 import doc
-import pandas as pd
 import recurring_ical_events
 import yaml
 from dateutil.relativedelta import *
@@ -76,11 +75,12 @@ def format_dtstart(event, local="America/Los_Angeles"):
     This thread might be a better longterm strategy:
     - https://stackoverflow.com/questions/1111317/how-do-i-print-a-datetime-in-the-local-timezone
 
-    @TODO: Can you have timezone info for an all day event? Do time,tz always appear together?"""
+    @TODO: Can you have timezone info for an all day event? Do time,tz always appear together?
+    """
     dtdt_start = event.decoded("DTSTART")
     if not isinstance(dtdt_start, datetime):
         return dtdt_start
-    if pd.isna(dtdt_start.tzinfo):
+    if dtdt_start.tzinfo is None:
         return dtdt_start
     formatted = dtdt_start.astimezone(ZoneInfo(local))
     return formatted
@@ -104,7 +104,8 @@ def find_events(ecal, caldate):
     """Look on `ecal` for `caldate` events that are candidate scheduled meetings.
 
     Handles recurring events that may not otherwise appear using `icalendar` save the first occurrence.
-    Note that events are only really considered if they have a title or 'SUMMARY' value."""
+    Note that events are only really considered if they have a title or 'SUMMARY' value.
+    """
     events = []
     for event in recurring_ical_events.of(ecal).at(caldate):
         dtstart = format_dtstart(event=event)
@@ -145,7 +146,8 @@ def find_events(ecal, caldate):
 def get_events(ecal, caldate):
     """Gather the formatted core details of all candidate events and prepare collection for markdown note.
 
-    @TODO: Think on the division of work between the `get_events()`, `find_events()`, `get_event_info()`, etc."""
+    @TODO: Think on the division of work between the `get_events()`, `find_events()`, `get_event_info()`, etc.
+    """
     events = find_events(ecal, caldate)
     out = []
     for event in events:
@@ -157,7 +159,7 @@ def get_events(ecal, caldate):
     return sorted(out)
 
 
-def add_events(notes, events):
+def add_events(notes, events, formats):
     notes.insert(prefix=formats["header"], text="On the Calendar")
     if len(events) < 1:
         notes.insert(prefix=formats["notes"], text="None\n\n")
@@ -168,6 +170,15 @@ def add_events(notes, events):
     return notes
 
 
+def run(notes, rules, args):
+    """
+    the meetings on the calendar at `args.ics` for the note's day
+    """
+    ecal = load_cal(args.ics)
+    events = get_events(ecal, caldate=notes.dailyday.replace("-", ""))
+    return add_events(notes, events, rules["format"])
+
+
 # }}}
 
 # main --- {{{
@@ -176,14 +187,8 @@ if __name__ == "__main__":
     args = get_args()
 
     rules = read_yaml(args.rules)
-    formats = rules["format"]
-
     notes = doc.from_json(args.json)
-    ecal = load_cal(args.ics)
-    caldate = notes.dailyday.replace("-", "")
-
-    events = get_events(ecal, caldate)
-    notes = add_events(notes, events)
+    notes = run(notes, rules, args)
 
     notes.to_json(args.json)
 # }}}
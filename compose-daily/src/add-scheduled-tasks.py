@@ -7,21 +7,31 @@
 # dependencies --- {{{
 import argparse
 import logging
-from os.path import isdir, isfile
-from pathlib import Path, PosixPath
+from datetime import date, timedelta
+from pathlib import Path
 from sys import stdout
 
 import doc
-import pandas as pd
+import yaml
+from taskindex import connect, index_path, query
 
+logger = logging.getLogger(__name__)
 # }}}
 
 
 # support methods {{{
 def get_args():
     parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", default="hand/rules.yml")
+    parser.add_argument("--json", default=None)
     parser.add_argument("--taskdir", default="~/git/my-TODO/tasks")
+    parser.add_argument("--tags", default=None)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--limit", type=int, default=50)
     args = parser.parse_args()
+    args.taskdir = str(Path(args.taskdir).expanduser())
+    assert Path(args.rules).exists()
+    assert Path(args.json).exists()
     assert Path(args.taskdir).exists()
     return args
 
@@ -42,20 +52,93 @@ def get_logger(sname, file_name=None):
     return logger
 
 
-def find_taskfiles(arg):
-    if isfile(arg):
-        return PosixPath(arg)
-    if isdir(arg):
-        return [path for path in Path(arg).rglob("*.parquet")]
-    return None
+def read_yaml(fname):
+    with open(fname, "r") as f:
+        rules = yaml.safe_load(f)
+    return rules
 
 
-def prep_tasks(arg):
-    fs = find_taskfiles(arg)
-    assert fs != []
-    assert Path(fs[0]).exists()
-    out = pd.concat([pd.read_parquet(f) for f in fs])
-    return out
+def read_store(taskdir, tags, filters):
+    """
+    the same rows from the parquet store, for a taskdir without an index.
+    imported here, since the store needs pandas and the index doesn't
+    """
+    from taskstore import read_tasks
+
+    out = read_tasks(
+        taskdir,
+        columns=["task", "form_tag", "due", "source", "lineno"],
+        tags=tags,
+        filters=filters,
+    )
+    out["due"] = out.due.where(out.due.notna(), None)
+    return out.to_dict("records")
+
+
+def prep_tasks(taskdir, dailyday, tags=None, days=7):
+    """
+    only the tags we were asked for, and only open tasks: all of them for
+    the requested tags, otherwise just the ones due within `days` of the note
+    (overdue included). they come from the sqlite index the importer keeps
+    next to the store (an indexed lookup, and no pandas to load),
+    or from the store itself with the filters pushed down to the parquet reads
+    """
+    tags = tags.split(",") if tags else None
+    cutoff = (date.fromisoformat(dailyday) + timedelta(days=days)).isoformat()
+    if Path(index_path(taskdir)).exists():
+        conn = connect(index_path(taskdir))
+        rows = query(conn, tags=tags, state="open", due_to=None if tags else cutoff)
+        conn.close()
+    else:
+        filters = [("completed", "==", False)]
+        if not tags:
+            filters.append(("due", "<=", cutoff))
+        rows = read_store(taskdir, tags, filters)
+    # one line per task, even when it has more than one timeline
+    out, seen = [], set()
+    for row in rows:
+        key = (row["form_tag"], row["source"], row["lineno"], row["task"])
+        if key not in seen:
+            seen.add(key)
+            out.append(row)
+    return sorted(
+        out,
+        key=lambda row: (
+            row["due"] is None,
+            row["due"] or "",
+            row["form_tag"],
+            row["task"],
+        ),
+    )
+
+
+def add_tasks(notes, tasks, limit, formats):
+    """
+    '- [ ] ' rather than the TODO format, so importing the daily note
+    doesn't pick these up again as new tasks
+    """
+    notes.insert(prefix=formats["header"], text="Open tasks")
+    if not tasks:
+        notes.insert(prefix=formats["notes"], text="None\n\n")
+        return notes
+    for row in tasks[:limit]:
+        due = f", due {row['due']}" if row["due"] else ""
+        notes.insert(
+            prefix=formats["meeting"], text=f"{row['task']} ({row['form_tag']}{due})"
+        )
+    if len(tasks) > limit:
+        notes.insert(prefix=formats["notes"], text=f"and {len(tasks) - limit} more")
+    notes.insert(prefix="", text="\n")
+    return notes
+
+
+def run(notes, rules, args):
+    """
+    the open tasks from the store at `args.taskdir` that the note should show
+    """
+    tasks = prep_tasks(args.taskdir, notes.dailyday, tags=args.tags, days=args.days)
+    logger.info(f"{len(tasks)} open tasks for {notes.dailyday}")
+    return add_tasks(notes, tasks, args.limit, rules["format"])
 
 
 # }}}
@@ -68,7 +151,11 @@ if __name__ == "__main__":
     # arg handling
     args = get_args()
 
-    # no bumps on this road yet, just some with scheduled events
-    # this will soon be amended to add task lines to the dailyfile
-    # can happen regardless of if recurring meetings are being added right
-    tasks = prep_tasks(args.taskdir)
+    rules = read_yaml(args.rules)
+    # }}}
+
+    notes = doc.from_json(args.json)
+    notes = run(notes, rules, args)
+
+    notes.to_json(args.json)
+# }}}
@@ -51,20 +51,11 @@ def read_yaml(fname):
     return rules
 
 
-# }}}
-
-# main --- {{{
-if __name__ == "__main__":
-    # basic setup --- {{{
-    # setup logging
-    logger = get_logger(__name__, "output/add-task-sections.log")
-    # arg handling
-    args = get_args()
-
-    rules = read_yaml(args.rules)
+def run(notes, rules, args):
+    """
+    the sections filled in by hand during the day
+    """
     formats = rules["format"]
-
-    notes = doc.from_json(args.json)
     notes.insert(prefix=formats["header"], text="Agenda")
     notes.insert(prefix=formats["meeting"], text="keep up with emails")
     notes.insert(prefix=formats["meeting"], text="take notes from the day")
@@ -84,7 +75,24 @@ if __name__ == "__main__":
     notes.insert(prefix="", text="\n")
     notes.insert(prefix=formats["subheader"], text="Commands of the day")
     notes.insert(prefix="", text="\n")
+    return notes
+
+
+# }}}
+
+# main --- {{{
+if __name__ == "__main__":
+    # basic setup --- {{{
+    # setup logging
+    logger = get_logger(__name__, "output/add-task-sections.log")
+    # arg handling
+    args = get_args()
+
+    rules = read_yaml(args.rules)
+
+    notes = doc.from_json(args.json)
+    notes = run(notes, rules, args)
 
     notes.to_json(args.json)
-    notes.to_md(args.output)
+    notes.to_md(args.output, only_if_changed=True)
 # }}}
@@ -5,108 +5,259 @@
 # =========================================
 
 # dependencies --- {{{
+import hashlib
 import json
 import sys
+from itertools import islice
+from pathlib import Path
 
 sys.path.append("../templates")
 from line import Line
 
 # }}}
 
+# lines per write() when rendering, so a big note isn't one giant string
+CHUNK_LINES = 1 << 10
+# json layout written by to_json; files without it are the per-line layout
+# ({"lines": {"0": {prefix, text, suffix}, ...}}), which from_json still reads
+FORMAT = 2
+# what to_json leaves out: it's all rebuilt from the lines by from_columns
+DERIVED = ("head", "tail", "size", "filename", "sections", "last_section")
+
 
 # Reminder:
 #     Line(prefix, text, suffix='\n')
-class Doc:
+class Digest:
     """
-    Loosely based on a linked list, which might be overdoing it,
-    the idea is to be flexible about formatting (prefix, suffix of Line)
-    while making it easier to capture content (text of Line)
-    including tag(s), timeline for TODO items,
-    and also maintaining structure/flow of daily note document
+    a write-only text stream that only hashes what's written to it,
+    so a Doc can be compared to a file without building the whole note
+    """
+
+    def __init__(self):
+        self.hash = hashlib.sha1()
+        self.size = 0
+
+    def write(self, text):
+        data = text.encode()
+        self.hash.update(data)
+        self.size += len(data)
+        return len(text)
+
+
+def file_digest(fname):
+    digest = hashlib.sha1()
+    with open(fname, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
-    if it turns out that self.next is not a useful attribute,
-    and we are still only interested in inserting at the end of existing Doc,
-    then maybe using index/size as self.end can achieve the same thing
-    while preserving the flexible construction of the Doc
+
+class Fragment:
     """
+    a run of Lines with the Doc's insert(), not yet part of a Doc:
+    a stage can build its lines in one while other stages build theirs,
+    and Doc.splice() links them in later. `path` and `dailyday` are
+    the Doc's, for stages that need to know which note they're writing
 
-    def __init__(
-        self,
-        prefix,
-        text,
-        path,
-        dailyday=False,
-        suffix="\n",
-    ):
-        self.head = Line(prefix=prefix, text=text, suffix=suffix)
+    headers (a prefix starting with '#') are anchors: self.sections
+    maps each header's text to the last Line of its section, which runs
+    to the next header of any level. lines before the first header
+    are under None
+    """
+
+    def __init__(self, path, dailyday=False):
+        self.head = None
+        self.tail = None
+        self.size = 0
+        self.sections = {}
+        self.last_section = None
         self.path = path
-        self.filename = path[path.rfind("/") :]
         self.dailyday = dailyday
 
     def __repr__(self):
         """
         assume this is about previewing the Doc object
         """
-        cur_line = self.head
-        comp = f"{cur_line}"
-        if not cur_line.next:
-            return comp
-        while cur_line.next:
-            cur_line = cur_line.next
-            comp += f"{cur_line}"
-        return comp
+        return "".join(map(str, self))
 
     def __len__(self):
-        size = 1
+        return self.size
+
+    def __iter__(self):
         cur_line = self.head
-        if not cur_line.next:
-            return size
-        while cur_line.next:
-            size += 1
+        while cur_line:
+            yield cur_line
             cur_line = cur_line.next
-        return size
+
+    def anchor(self, line):
+        """
+        `line` was just added at the end: a header starts a new section,
+        anything else is the new end of the last one
+        """
+        if line.prefix.startswith("#"):
+            self.last_section = line.text.strip()
+        self.sections[self.last_section] = line
+        return 1
 
     def insert(self, prefix, text, suffix="\n"):
         """
         insert at the end of the Doc
         """
         new_line = Line(prefix=prefix, text=text, suffix=suffix)
-        cur_line = self.head
-        while cur_line.next:
-            cur_line = cur_line.next
-        cur_line.next = new_line
+        if self.tail is None:
+            self.head = new_line
+        else:
+            self.tail.next = new_line
+        self.tail = new_line
+        self.size += 1
+        return self.anchor(new_line)
+
+    def insert_into(self, section, prefix, text, suffix="\n"):
+        """
+        insert at the end of `section` (the text of its header), right before
+        the next header; the section's last Line is kept in self.sections,
+        so this is as cheap as insert() wherever the section is
+        """
+        after = self.sections[section]
+        if after is self.tail:
+            return self.insert(prefix, text, suffix)
+        new_line = Line(prefix=prefix, text=text, suffix=suffix)
+        new_line.next = after.next
+        after.next = new_line
+        self.size += 1
+        if prefix.startswith("#"):
+            section = text.strip()
+        self.sections[section] = new_line
         return 1
 
+    def splice(self, fragment, section=None):
+        """
+        link every Line of `fragment` in at the end of `section`
+        (at the end of the Doc if None), however long either of them is;
+        its headers join self.sections. `fragment` is used up
+        """
+        if not fragment.size:
+            return 0
+        after = self.tail if section is None else self.sections[section]
+        owner = self.last_section if section is None else section
+        fragment.tail.next = after.next
+        after.next = fragment.head
+        self.size += fragment.size
+        # the fragment's lines before its first header are the end of `owner` now
+        lead = fragment.sections.pop(None, None)
+        if lead is not None:
+            self.sections[owner] = lead
+        self.sections.update(fragment.sections)
+        if after is self.tail:
+            self.tail = fragment.tail
+            if fragment.last_section is not None:
+                self.last_section = fragment.last_section
+        fragment.head, fragment.tail, fragment.size = None, None, 0
+        fragment.sections, fragment.last_section = {}, None
+        return 1
+
+
+class Doc(Fragment):
+    """
+    Loosely based on a linked list, which might be overdoing it,
+    the idea is to be flexible about formatting (prefix, suffix of Line)
+    while making it easier to capture content (text of Line)
+    including tag(s), timeline for TODO items,
+    and also maintaining structure/flow of daily note document
+
+    self.tail is the last Line and self.size the number of Lines,
+    so inserting at the end and len() don't walk the list;
+    self.sections does the same for the end of every section (see Fragment)
+    """
+
+    def __init__(
+        self,
+        prefix,
+        text,
+        path,
+        dailyday=False,
+        suffix="\n",
+    ):
+        super().__init__(path=path, dailyday=dailyday)
+        self.filename = path[path.rfind("/") :]
+        self.insert(prefix=prefix, text=text, suffix=suffix)
+
+    def fragment(self):
+        """
+        an empty Fragment for this Doc, to splice() in once it's filled
+        """
+        return Fragment(path=self.path, dailyday=self.dailyday)
+
     def to_dict(self):
-        out = {
-            tup[0]: tup[1]
-            for tup in self.__dict__.items()
-            if ("head" not in tup[0]) & ("file" not in tup[0])
-        }
-        out["lines"] = {
-            "0": {
-                tup[0]: tup[1] for tup in self.head.__dict__.items() if tup[0] != "next"
-            }
-        }
-        cur_line = self.head
-        for i in range(1, len(self)):
-            cur_line = cur_line.next
-            out["lines"][str(i)] = {
-                tup[0]: tup[1] for tup in cur_line.__dict__.items() if tup[0] != "next"
-            }
+        """
+        columnar: one list each of prefixes, texts and suffixes, a line per position.
+        prefixes and suffixes only take a handful of values, so those lists
+        are codes into "prefixes"/"suffixes"
+        """
+        out = {tup[0]: tup[1] for tup in self.__dict__.items() if tup[0] not in DERIVED}
+        out["format"] = FORMAT
+        lines = list(self)
+        for col, values in (("prefix", "prefixes"), ("suffix", "suffixes")):
+            codes = {}
+            out[col] = [
+                codes.setdefault(getattr(line, col), len(codes)) for line in lines
+            ]
+            out[values] = list(codes)
+        out["text"] = [line.text for line in lines]
         return out
 
     def to_json(self, jsonfile):
-        json_data = json.dumps(self.to_dict(), sort_keys=True, indent=4)
+        """
+        one key per line of the file, each column list on its own line
+        """
+        data = self.to_dict()
+        json_data = (
+            "{\n"
+            + ",\n".join(
+                f"{json.dumps(key)}: {json.dumps(data[key])}" for key in sorted(data)
+            )
+            + "\n}\n"
+        )
         with open(jsonfile, "w") as f:
             f.write(json_data)
-            f.close()
         return f"{jsonfile} written successfully"
 
-    def to_md(self, mdfile):
+    def render(self, stream):
+        """
+        write the note to any text stream (an open file, sys.stdout,
+        a socket's makefile("w")), CHUNK_LINES lines per write
+        """
+        chunk = []
+        for line in self:
+            chunk.append(str(line))
+            if len(chunk) == CHUNK_LINES:
+                stream.write("".join(chunk))
+                chunk = []
+        if chunk:
+            stream.write("".join(chunk))
+        return 1
+
+    def unchanged(self, mdfile):
+        """
+        whether `mdfile` already holds exactly this note
+        """
+        if not Path(mdfile).exists():
+            return False
+        digest = Digest()
+        self.render(digest)
+        if digest.size != Path(mdfile).stat().st_size:
+            return False
+        return digest.hash.hexdigest() == file_digest(mdfile)
+
+    def to_md(self, mdfile, only_if_changed=False):
+        """
+        with only_if_changed, a file that already holds this note is left alone,
+        so its mtime doesn't move and make doesn't see a change
+        """
+        if only_if_changed and self.unchanged(mdfile):
+            return 0
         with open(mdfile, "w") as f:
-            f.write(self.__repr__())
-            f.close()
+            self.render(f)
         return 1
 
 
@@ -116,22 +267,42 @@ def read_json(jsonfile):
     return data
 
 
-def from_json(jsonfile):
-    json_data = read_json(jsonfile)
-    n_lines = max([int(k) for k in json_data["lines"].keys()])
-    head_data = json_data["lines"]["0"]
+def from_columns(prefixes, texts, suffixes, path, dailyday=False):
+    """
+    a whole Doc in one pass, linking the Lines directly
+    instead of going through insert() for each one
+    """
     self = Doc(
-        prefix=head_data["prefix"],
-        text=head_data["text"],
-        suffix=head_data["suffix"],
-        path=json_data["path"],
-        dailyday=json_data["dailyday"],
+        prefix=prefixes[0],
+        text=texts[0],
+        suffix=suffixes[0],
+        path=path,
+        dailyday=dailyday,
     )
-    for i in range(1, n_lines + 1):
-        line_data = json_data["lines"][str(i)]
-        self.insert(
-            prefix=line_data["prefix"],
-            text=line_data["text"],
-            suffix=line_data["suffix"],
-        )
+    tail = self.head
+    for prefix, text, suffix in islice(zip(prefixes, texts, suffixes), 1, None):
+        tail.next = Line(prefix, text, suffix)
+        tail = tail.next
+        self.anchor(tail)
+    self.tail = tail
+    self.size = len(texts)
     return self
+
+
+def from_dict(data):
+    if "format" not in data:
+        lines = [data["lines"][str(i)] for i in range(len(data["lines"]))]
+        columns = [
+            [line[col] for line in lines] for col in ("prefix", "text", "suffix")
+        ]
+    else:
+        columns = [
+            [data["prefixes"][code] for code in data["prefix"]],
+            data["text"],
+            [data["suffixes"][code] for code in data["suffix"]],
+        ]
+    return from_columns(*columns, path=data["path"], dailyday=data["dailyday"])
+
+
+def from_json(jsonfile):
+    return from_dict(read_json(jsonfile))
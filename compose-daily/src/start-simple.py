@@ -66,17 +66,17 @@ def format_date(from_arg, date=datetime.now()):
     return form.astimezone(ZoneInfo("US/Pacific"))
 
 
-def prep_out():
-    if not args.date:
+def prep_out(givendate, outdir):
+    if not givendate:
         today = format_date(from_arg=False)
     else:
-        today = format_date(from_arg=True, date=args.date)
-    path = f"{args.outputdir}/{today.strftime('%Y-%m-%d')}"
+        today = format_date(from_arg=True, date=givendate)
+    path = f"{outdir}/{today.strftime('%Y-%m-%d')}"
     today = today
     return path, today
 
 
-def check_holidays():
+def check_holidays(today, countries, markets):
     by_county = {holidays.country_holidays(country).get(today) for country in countries}
     by_market = {holidays.financial_holidays(market).get(today) for market in markets}
     found = {v for v in by_county.union(by_market) if v}
@@ -85,15 +85,14 @@ def check_holidays():
     return found
 
 
-def add_holidays(notes):
-    found = check_holidays()
+def add_holidays(notes, found, formats):
     label = "National or financial holiday(s)"
     notes.insert(prefix=formats["notes"], text=f"{label}:\t{found}")
     notes.insert(prefix="", text="")
     return notes
 
 
-def add_5min(notes, prompt):
+def add_5min(notes, prompt, formats):
     notes.insert(prefix=formats["subheader"], text=prompt)
     for i in range(1, 2):
         notes.insert(prefix=f"{i}. ", text="____________________")
@@ -101,6 +100,29 @@ def add_5min(notes, prompt):
     return notes
 
 
+def run(notes, rules, args):
+    """
+    the first stage: starts the Doc (`notes` is ignored), for `args.date`
+    """
+    formats = rules["format"]
+    path, today = prep_out(givendate=args.date, outdir=args.outputdir)
+    notes = Doc(
+        prefix="# ",
+        text=today.strftime("%A, %d %B %Y"),
+        path=path,
+        dailyday=today.strftime("%Y-%m-%d"),
+    )
+    found = check_holidays(
+        today, countries=rules["countries"].split(), markets=rules["markets"].split()
+    )
+    notes = add_holidays(notes, found, formats)
+    notes = add_5min(notes, prompt="I'm grateful for...", formats=formats)
+    notes = add_5min(notes, prompt="What would make today great?", formats=formats)
+    notes = add_5min(notes, prompt="Media of the day", formats=formats)
+    notes.insert(prefix="", text="")
+    return notes
+
+
 # }}}
 
 # main --- {{{
@@ -113,25 +135,6 @@ if __name__ == "__main__":
     # }}}
 
     rules = read_yaml(args.rules)
-    countries = rules["countries"].split()
-    markets = rules["markets"].split()
-    formats = rules["format"]
-
-    # dynamic setup
-    path, today = prep_out()
-
-    # do the thing
-    notes = Doc(
-        prefix="# ",
-        text=today.strftime("%A, %d %B %Y"),
-        path=path,
-        dailyday=today.strftime("%Y-%m-%d"),
-    )
-    notes = add_holidays(notes)
-    notes = add_5min(notes, prompt="I'm grateful for...")
-    notes = add_5min(notes, prompt="What would make today great?")
-    notes = add_5min(notes, prompt="Media of the day")
-    notes.insert(prefix="", text="")
-
+    notes = run(None, rules, args)
     notes.to_json(args.output)
 # }}}
@@ -26,6 +26,7 @@ PACIFIC = timezone('US/Pacific')
 ALT_AUTHORNAMES = (
     'bp', 'bailey', 'baileyb0t',
 )
+logger = logging.getLogger(__name__)
 # }}}
 
 # support methods {{{
@@ -183,16 +184,14 @@ def summarizerecent(changes):
                 authored.n_lines.sum():,} line change(s).\n"""
             summaries.append(authorsummary)
     return "\n".join(summaries) + "\n"
-# }}}
 
-# main --- {{{
-if __name__ == '__main__':
-    logger = get_logger(__name__, "output/add-scheduled-meetings.log")
-    args = get_args()
 
-    rules = read_yaml(args.rules)
+def run(notes, rules, args):
+    """
+    last quarter's commits across the repos under ~/git, by author
+    (and every commit to `args.outchanges` as csv, if given)
+    """
     formats = rules['format']
-    notes = doc.from_json(args.injson)
 
     base = findrepos(gitdir="~/git")
     base = checkrepos(info=base)
@@ -219,8 +218,21 @@ if __name__ == '__main__':
 
     notes.insert(prefix=formats['header'], text='Repo activity')
     notes.insert(prefix=formats['text'], text=summary)
+    if args.outchanges: changes.to_csv(args.outchanges, index=False)
+    return notes
+
+
+# }}}
+
+# main --- {{{
+if __name__ == '__main__':
+    logger = get_logger(__name__, "output/add-scheduled-meetings.log")
+    args = get_args()
+
+    rules = read_yaml(args.rules)
+    notes = doc.from_json(args.injson)
+    notes = run(notes, rules, args)
 
     notes.to_json(args.outjson)
-    notes.to_md(args.outmd)
-    changes.to_csv(args.outchanges, index=False)
+    notes.to_md(args.outmd, only_if_changed=True)
 # }}}
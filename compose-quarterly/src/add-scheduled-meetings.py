@@ -19,6 +19,7 @@ import pandas as pd
 from icalendar import Calendar
 import recurring_ical_events
 import doc
+logger = logging.getLogger(__name__)
 # }}}
 
 IGNOREABLE = (
@@ -156,17 +157,14 @@ def add_events(notes, events, prefix):
         notes.insert(prefix=prefix,
                      text=text)
     return notes
-# }}}
 
-# main --- {{{
-if __name__ == '__main__':
-    logger = get_logger(__name__, "output/add-scheduled-meetings.log")
-    args = get_args()
 
+def run(notes, rules, args):
+    """
+    last quarter's meetings, from the calendar at `args.ics`
+    """
     ecal = load_cal(args.ics)
-    rules = read_yaml(args.rules)
     formats = rules['format']
-    notes = doc.from_json(args.json)
 
     e = date.today().replace(day=1) - relativedelta(days=1)
     s = (e - relativedelta(months=2)).replace(day=1)
@@ -180,6 +178,19 @@ if __name__ == '__main__':
         events = get_events(ecal, caldate)
         notes = add_events(notes, events, prefix=formats['meeting_done'])
     notes.insert(prefix=formats['text'], text='')
+    return notes
+
+
+# }}}
+
+# main --- {{{
+if __name__ == '__main__':
+    logger = get_logger(__name__, "output/add-scheduled-meetings.log")
+    args = get_args()
+
+    rules = read_yaml(args.rules)
+    notes = doc.from_json(args.json)
+    notes = run(notes, rules, args)
 
     notes.to_json(args.output)
 # }}}
@@ -16,6 +16,7 @@ from zoneinfo import ZoneInfo
 from datetime import date, datetime
 from dateutil.relativedelta import *
 from doc import Doc
+logger = logging.getLogger(__name__)
 # }}}
 
 # support methods {{{
@@ -66,14 +67,12 @@ def prep_out(givendate, outdir):
     path = f"{outdir}/{today.strftime('%Y-%m-%d')}"
     today = today
     return path, today
-# }}}
 
-# main --- {{{
-if __name__ == '__main__':
-    logger = get_logger(__name__, "output/start-simple.log")
-    args = get_args()
 
-    rules = read_yaml(args.rules)
+def run(notes, rules, args):
+    """
+    the first stage: starts the Doc (`notes` is ignored) for last quarter
+    """
     formats = rules['format']
 
     # Define 'quarter' flexibly as prior three months
@@ -94,6 +93,18 @@ if __name__ == '__main__':
     notes.insert(prefix=formats['notes'], text='\n')
     notes.insert(prefix=formats['subheader'], text='Back-back-burner')
     notes.insert(prefix=formats['notes'], text='\n\n')
+    return notes
+
+
+# }}}
+
+# main --- {{{
+if __name__ == '__main__':
+    logger = get_logger(__name__, "output/start-simple.log")
+    args = get_args()
+
+    rules = read_yaml(args.rules)
+    notes = run(None, rules, args)
 
     notes.to_json(args.output)
 # }}}
@@ -20,6 +20,7 @@ from dateutil.relativedelta import *
 from pytz import timezone
 
 PACIFIC = timezone("US/Pacific")
+logger = logging.getLogger(__name__)
 # }}}
 
 
@@ -86,7 +87,8 @@ def checkrepos(info):
 
 def recentcommits(info, sdate, edate, author):
     """Authored datetime is preserved on rebase, and
-    we want to include commits from this week that might have been rebasing an earlier commit."""
+    we want to include commits from this week that might have been rebasing an earlier commit.
+    """
     ignore = [
         "inside-outside-calls",
     ]
@@ -179,16 +181,11 @@ def summarizerecent(repos):
     return fullsummary
 
 
-# }}}
-
-# main --- {{{
-if __name__ == "__main__":
-    logger = get_logger(__name__, "output/add-scheduled-meetings.log")
-    args = get_args()
-
-    rules = read_yaml(args.rules)
+def run(notes, rules, args):
+    """
+    last week's commits across the repos under ~/git
+    """
     formats = rules["format"]
-    notes = doc.from_json(args.injson)
 
     base = findrepos(gitdir="~/git")
     base = checkrepos(info=base)
@@ -203,7 +200,20 @@ if __name__ == "__main__":
 
     notes.insert(prefix=formats["header"], text="Repo activity")
     notes.insert(prefix=formats["text"], text=summary)
+    return notes
+
+
+# }}}
+
+# main --- {{{
+if __name__ == "__main__":
+    logger = get_logger(__name__, "output/add-scheduled-meetings.log")
+    args = get_args()
+
+    rules = read_yaml(args.rules)
+    notes = doc.from_json(args.injson)
+    notes = run(notes, rules, args)
 
     notes.to_json(args.outjson)
-    notes.to_md(args.outmd)
+    notes.to_md(args.outmd, only_if_changed=True)
 # }}}
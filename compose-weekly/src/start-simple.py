@@ -75,16 +75,11 @@ def prep_out(givendate, outdir):
     return path, today
 
 
-# }}}
-
-# main --- {{{
-if __name__ == "__main__":
-    logger = get_logger(__name__, "output/start-simple.log")
-    args = get_args()
-
-    rules = read_yaml(args.rules)
+def run(notes, rules, args):
+    """
+    the first stage: starts the Doc (`notes` is ignored) for this week
+    """
     formats = rules["format"]
-
     path, today = prep_out(givendate=date.today().strftime("%Y%m%d"), outdir="./")
     notes = Doc(
         prefix="# ",
@@ -101,6 +96,17 @@ if __name__ == "__main__":
     notes.insert(prefix=formats["notes"], text="\n")
     notes.insert(prefix=formats["subheader"], text="Back-back-burner")
     notes.insert(prefix=formats["notes"], text="\n\n")
+    return notes
 
+
+# }}}
+
+# main --- {{{
+if __name__ == "__main__":
+    logger = get_logger(__name__, "output/start-simple.log")
+    args = get_args()
+
+    rules = read_yaml(args.rules)
+    notes = run(None, rules, args)
     notes.to_json(args.output)
 # }}}
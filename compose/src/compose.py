@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# vim: set ts=4 sts=0 sw=4 si fenc=utf-8 et:
+# vim: set fdm=marker fmr={{{,}}} fdl=0 foldcolumn=4:
+# Authors:     BP
+# =========================================
+"""
+compose daily|weekly|quarterly --output NOTE.md [--rules RULES] [--ics CAL]
+        [--date YYYY-MM-DD] [--outputdir DIR] [--taskdir TASKDIR] [--tags TAGS]
+        [--days N] [--limit N] [--outchanges CSV]
+        [--jobs N] [--debug-json DIR] [--timings FILE]
+
+builds a note by running the stages in compose-<kind>/src, the same scripts
+the Makefiles used to run one process at a time, as functions in this one
+process. pandas, icalendar, holidays and yaml are imported once, rules.yml is
+read once, and nothing goes through JSON. after the first stage, which starts
+the Doc, the stages run side by side on fragments that are spliced into it
+in order (see run_stages)
+
+--jobs N: how many of those stages run at once (1: one after the other)
+
+--debug-json DIR: also write what each stage left behind, as
+DIR/<date>.<n>-<stage>.json (what used to be passed between the stages)
+--timings FILE: the seconds each stage took, as JSON (they are logged either way)
+"""
+
+# ---- dependencies {{{
+import argparse
+import importlib.util
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from sys import stdout
+
+import yaml
+
+# }}}
+
+HERE = Path(__file__).resolve().parents[2]
+# what each kind of note is made of, in order; every stage is a script
+# in compose-<kind>/src with a run(notes, rules, args) that returns the Doc
+# (or the Fragment it was given) with its lines added
+STAGES = {
+    "daily": [
+        "start-simple",
+        "add-scheduled-meetings",
+        "add-scheduled-tasks",
+        "add-task-sections",
+    ],
+    "weekly": ["start-simple", "add-scheduled-meetings", "add-repo-activity"],
+    "quarterly": ["start-simple", "add-scheduled-meetings", "add-repo-activity"],
+}
+
+
+# ---- support methods {{{
+def get_args():
+    parser = argparse.ArgumentParser(prog="compose")
+    parser.add_argument("kind", choices=list(STAGES))
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--rules", default=str(HERE / "templates" / "rules.yml"))
+    parser.add_argument("--ics", default=str(HERE / "calendar" / "output" / "mpb.ics"))
+    parser.add_argument("--date", default=None)
+    parser.add_argument("--outputdir", default=None)
+    parser.add_argument("--taskdir", default="~/git/tools/my-TODO/tasks")
+    parser.add_argument("--tags", default=None)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--outchanges", default=None)
+    parser.add_argument("--debug-json", default=None)
+    parser.add_argument("--timings", default=None)
+    parser.add_argument("--jobs", type=int, default=None)
+    args = parser.parse_args()
+    args.taskdir = str(Path(args.taskdir).expanduser())
+    if not args.outputdir:
+        args.outputdir = str(Path(args.output).parent)
+    assert Path(args.rules).exists()
+    return args
+
+
+def get_logger(sname, file_name=None):
+    logger = logging.getLogger(sname)
+    logger.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        "%(asctime)s - %(levelname)s " + "- %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
+    )
+    stream_handler = logging.StreamHandler(stdout)
+    stream_handler.setFormatter(formatter)
+    logger.addHandler(stream_handler)
+    if file_name:
+        file_handler = logging.FileHandler(file_name)
+        file_handler.setFormatter(formatter)
+        logger.addHandler(file_handler)
+    return logger
+
+
+def read_yaml(fname):
+    with open(fname, "r") as f:
+        rules = yaml.safe_load(f)
+    return rules
+
+
+def load_stages(kind, logger):
+    """
+    the stage scripts of compose-<kind>/src as modules (their file names
+    aren't importable as they are). that directory goes first on the path,
+    so `import doc` gets the Doc that kind of note is written with
+    """
+    srcdir = HERE / f"compose-{kind}" / "src"
+    sys.path[:0] = [str(srcdir), str(HERE / "templates")]
+    stages = []
+    for stage in STAGES[kind]:
+        spec = importlib.util.spec_from_file_location(
+            stage.replace("-", "_"), srcdir / f"{stage}.py"
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        # so what the stages log goes where the runner's log goes
+        module.logger = logger
+        stages.append((stage, module))
+    return stages
+
+
+def run_stage(module, notes, rules, args):
+    start = time.perf_counter()
+    notes = module.run(notes, rules, args)
+    return notes, time.perf_counter() - start
+
+
+def write_debug(notes, i, stage, args):
+    if not args.debug_json:
+        return 0
+    day = notes.dailyday if args.kind == "daily" else notes.weeklyday
+    notes.to_json(f"{args.debug_json}/{day}.{i}-{stage}.json")
+    return 1
+
+
+def run_stages(stages, rules, args):
+    """
+    the first stage starts the Doc. the others only add sections of their own,
+    so they run at the same time (args.jobs at most), each filling a Fragment
+    of its own, and the fragments are spliced in at the end of the Doc in
+    STAGES order, whichever finished first, so the note comes out the same.
+    returns the Doc and the seconds each stage took, and all of them together
+    """
+    (first, module), rest = stages[0], stages[1:]
+    notes, seconds = run_stage(module, None, rules, args)
+    timings = {first: seconds}
+    write_debug(notes, 0, first, args)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [
+            pool.submit(run_stage, module, notes.fragment(), rules, args)
+            for _, module in rest
+        ]
+        fragments = [future.result() for future in futures]
+    for i, ((stage, _), (fragment, seconds)) in enumerate(zip(rest, fragments), 1):
+        notes.splice(fragment)
+        timings[stage] = seconds
+        write_debug(notes, i, stage, args)
+    timings["(side by side)"] = time.perf_counter() - start
+    return notes, timings
+
+
+# }}}
+
+# ---- main {{{
+if __name__ == "__main__":
+    start = time.perf_counter()
+    args = get_args()
+    Path("output").mkdir(exist_ok=True)
+    logger = get_logger(__name__, f"output/compose-{args.kind}.log")
+    if args.debug_json:
+        Path(args.debug_json).mkdir(parents=True, exist_ok=True)
+
+    timings = {}
+    stages = load_stages(args.kind, logger)
+    timings["load"] = time.perf_counter() - start
+
+    mark = time.perf_counter()
+    rules = read_yaml(args.rules)
+    timings["rules"] = time.perf_counter() - mark
+
+    notes, stage_timings = run_stages(stages, rules, args)
+    timings.update(stage_timings)
+
+    mark = time.perf_counter()
+    notes.to_md(args.output, only_if_changed=True)
+    timings["write"] = time.perf_counter() - mark
+    timings["total"] = time.perf_counter() - start
+
+    for stage, seconds in timings.items():
+        logger.info(f"{stage:>24}: {seconds:.3f}s")
+    if args.timings:
+        with open(args.timings, "w") as f:
+            json.dump({k: round(v, 4) for k, v in timings.items()}, f, indent=1)
+    logger.info(f"{len(notes)} lines in {args.output}")
+
+# }}}
+# done.
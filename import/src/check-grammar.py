@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# vim: set ts=4 sts=0 sw=4 si fenc=utf-8 et:
+# vim: set fdm=marker fmr={{{,}}} fdl=0 foldcolumn=4:
+# Authors:     BP
+# =========================================
+
+# dependencies --- {{{
+import argparse
+import re
+from pathlib import Path
+
+import yaml
+from grammar import from_rules
+
+# }}}
+
+
+# support methods {{{
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", default="../templates/rules.yml")
+    parser.add_argument("--corpus", default="hand/todo-corpus.yml")
+    args = parser.parse_args()
+    assert Path(args.rules).exists()
+    assert Path(args.corpus).exists()
+    return args
+
+
+def read_yaml(fname):
+    with open(fname, "r") as f:
+        out = yaml.safe_load(f)
+    return out
+
+
+def legacy_clean_TODO(line):
+    """
+    the old clean_TODO, kept as-is (the 'regex' is a literal string here)
+    """
+    clean = line.replace("[^-]TODO[^-][:\\s]*", "").strip()
+    if clean[:2] == "- ":
+        clean = clean[2:]
+    return clean
+
+
+def legacy_parse(line, patterns):
+    """
+    the old three passes: tags, timelines, then clean + drop tags
+    """
+    tags = re.findall(patterns["tag"], line, flags=re.I)
+    timelines = re.findall(patterns["timeline"], line, flags=re.I)
+    task = re.sub(patterns["tag"], "", legacy_clean_TODO(line), flags=re.I)
+    return tags, timelines, task
+
+
+# }}}
+
+# main --- {{{
+if __name__ == "__main__":
+    args = get_args()
+    rules = read_yaml(args.rules)
+    grammar = from_rules(args.rules)
+    corpus = read_yaml(args.corpus)
+
+    parsed = grammar.parse_many([case["line"] for case in corpus])
+    for case, (tags, timelines, task) in zip(corpus, parsed):
+        expected = (case["tags"], case["timelines"], case["task"])
+        assert (tags, timelines, task) == expected, (case["line"], task)
+        legacy = legacy_parse(case["line"], rules)
+        assert legacy[:2] == expected[:2], case["line"]
+        assert legacy[2] == case.get("legacy_task", case["task"]), (
+            case["line"],
+            legacy[2],
+        )
+    print(f"{len(corpus)} corpus lines parse as expected")
+# }}}
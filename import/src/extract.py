@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# vim: set ts=4 sts=0 sw=4 si fenc=utf-8 et:
+# vim: set fdm=marker fmr={{{,}}} fdl=0 foldcolumn=4:
+# Authors:     BP
+# =========================================
+
+# dependencies --- {{{
+import json
+import logging
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+
+import pandas as pd
+
+# }}}
+
+# warnings from the workers; import.py's log isn't theirs to write to
+logger = logging.getLogger(__name__)
+# files at least this big get memory-mapped instead of read in
+MMAP_BYTES = 1 << 23
+# a NUL in the first block means it's not a text file
+HEAD_BYTES = 1 << 13
+TODO_MARK = re.compile(rb"todo", flags=re.I)
+# the stretch between two hits has its newlines counted this many bytes at a time
+COUNT_BYTES = 1 << 20
+# comment mark for the code files that get scanned along with the notes
+COMMENTS = {
+    ".py": "#",
+    ".sh": "#",
+    ".R": "#",
+    ".r": "#",
+    ".sql": "--",
+    ".mk": "#",
+    "Makefile": "#",
+}
+# notebook keys that can be huge and never hold a TODO we want
+NB_SKIP = ("outputs", "attachments")
+NB_SEP = re.compile(r"[\s,]*")
+NB_CELLS = re.compile(r'"cells"\s*:\s*\[')
+# characters of a notebook read at a time
+NB_CHUNK = 1 << 20
+
+
+# Reminder:
+#     record = {source, lineno, cell, TODO_line, tags, timelines, task}
+# one record per TODO line, its tags and timelines as lists
+def count_newlines(buf, start, end):
+    """
+    newlines in buf[start:end], counted a block at a time, so a long
+    stretch of a memory-mapped file is never copied out in one piece
+    """
+    return sum(
+        buf[pos : min(pos + COUNT_BYTES, end)].count(b"\n")
+        for pos in range(start, end, COUNT_BYTES)
+    )
+
+
+def scan_buffer(buf):
+    """
+    a case-insensitive byte search jumps straight to each 'todo',
+    and only the line around it gets decoded.
+    line numbers come from counting newlines between hits
+    """
+    lineno, counted, end = 1, 0, -1
+    for match in TODO_MARK.finditer(buf):
+        if match.start() <= end:
+            # another 'todo' on a line that's already been yielded
+            continue
+        start = buf.rfind(b"\n", 0, match.start()) + 1
+        end = buf.find(b"\n", match.start())
+        end = len(buf) if end < 0 else end
+        lineno += count_newlines(buf, counted, start)
+        counted = start
+        line = buf[start : end + 1].decode("utf-8", errors="replace")
+        if line.endswith("\r\n"):
+            line = line[:-2] + "\n"
+        yield lineno, line
+
+
+def iter_todo_lines(fname):
+    """
+    filters for lines with 'TODO' mark without going through the file line by line.
+    small files are read in one go, big ones (exported logs, transcripts)
+    are memory-mapped so they never have to fit in memory.
+    binary files are skipped
+    """
+    size = os.path.getsize(fname)
+    if size == 0:
+        return
+    with open(fname, "rb") as f:
+        if b"\0" in f.read(HEAD_BYTES):
+            return
+        if size < MMAP_BYTES:
+            f.seek(0)
+            yield from scan_buffer(f.read())
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield from scan_buffer(buf)
+
+
+def iter_lines_from(fname, offset=0, lineno=0):
+    """
+    for tailing a note that's being appended to:
+    every complete line after byte `offset`, with its line number
+    and the byte offset just past it (a half-written last line is left for next time)
+    """
+    with open(fname, "rb") as f:
+        f.seek(offset)
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            lineno += 1
+            offset += len(raw)
+            yield lineno, raw.decode("utf-8", errors="replace"), offset
+
+
+def comment_of(fname):
+    name = os.path.basename(fname)
+    return COMMENTS.get(name, COMMENTS.get(os.path.splitext(name)[1]))
+
+
+def comment_start(line, mark):
+    """
+    where the comment starts on a line of code: the first `mark`
+    outside of a string, at the start of the line or after whitespace
+    """
+    quote, escaped = None, False
+    for i, char in enumerate(line):
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif line.startswith(mark, i) and ((i == 0) or line[i - 1].isspace()):
+            return i
+    return -1
+
+
+def comment_lines(numbered_lines, mark):
+    """
+    only TODOs in comments count in code, and only the comment text is kept
+    (so `x = 1  # TODO: y` gives the task 'y')
+    """
+    for lineno, line in numbered_lines:
+        start = comment_start(line, mark)
+        if (start < 0) or ("todo" not in line[start:].lower()):
+            continue
+        yield lineno, line[start:].lstrip(mark[0])
+
+
+def iter_notebook_cells(fname, chunk=NB_CHUNK):
+    """
+    the cells of a notebook, one at a time: the file is read `chunk` characters
+    at a time, and each cell object is decoded once all of it has been read
+    (outputs and attachments dropped as soon as they're parsed), then let go of.
+    only the cell being read is ever held, never the whole notebook.
+    notebooks without a 'todo' anywhere are passed over by the byte search.
+    a notebook that's truncated or isn't JSON raises ValueError
+    """
+    lines = iter_todo_lines(fname)
+    hit = next(lines, None)
+    lines.close()
+    if hit is None:
+        return
+    decoder = json.JSONDecoder(
+        object_pairs_hook=lambda pairs: {k: v for k, v in pairs if k not in NB_SKIP}
+    )
+    with open(fname, "r", encoding="utf-8", errors="replace") as f:
+        text = f.read(chunk)
+        found = NB_CELLS.search(text)
+        while (not found) and (piece := f.read(chunk)):
+            text += piece
+            found = NB_CELLS.search(text)
+        if not found:
+            return
+        # a cell bigger than what's been read: read twice as much each time,
+        # so it's decoded a few times at most, not once per chunk
+        text, cell, want = text[found.end() :], 0, chunk
+        while True:
+            pos = NB_SEP.match(text).end()
+            if pos == len(text):
+                piece = f.read(want)
+                if not piece:
+                    return
+                text += piece
+                continue
+            if text[pos] == "]":
+                return
+            try:
+                content, pos = decoder.raw_decode(text, pos)
+            except json.JSONDecodeError:
+                piece = f.read(want)
+                if not piece:
+                    raise
+                text, want = text + piece, want * 2
+                continue
+            if not isinstance(content, dict):
+                raise ValueError(f"cell {cell + 1} is not an object")
+            text, want = text[pos:], chunk
+            cell += 1
+            yield cell, content
+
+
+def cell_lines(content):
+    """
+    TODO lines from one notebook cell, numbered within the cell.
+    markdown cells are read like notes, code cells like .py files
+    """
+    source = content.get("source", [])
+    if isinstance(source, str):
+        source = source.splitlines(keepends=True)
+    lines = [
+        (lineno, line if line.endswith("\n") else f"{line}\n")
+        for lineno, line in enumerate(source, start=1)
+        if "todo" in line.lower()
+    ]
+    if content.get("cell_type") == "code":
+        return list(comment_lines(lines, "#"))
+    return lines
+
+
+def line_records(source, numbered_lines, grammar, cell=None):
+    for lineno, line in numbered_lines:
+        # minor fix for legacy notes
+        line = line.replace("[tech]", "(tech)")
+        tags, timelines, task = grammar.parse(line)
+        yield {
+            "source": source,
+            "lineno": lineno,
+            "cell": cell,
+            "TODO_line": line,
+            "tags": tags if tags else ["untagged"],
+            "timelines": timelines,
+            "task": task,
+        }
+
+
+def iter_records(paths, grammar):
+    for path in paths:
+        source = str(path)
+        if source.endswith(".ipynb"):
+            # all of a notebook's cells (without their outputs) before any
+            # of its records, so a notebook that's cut short adds none
+            try:
+                cells = list(iter_notebook_cells(path))
+            except ValueError as err:
+                # truncated or not JSON: one bad notebook doesn't stop the import
+                logger.warning(f"skipping {source}, not a readable notebook: {err}")
+                continue
+            for cell, content in cells:
+                yield from line_records(source, cell_lines(content), grammar, cell=cell)
+            continue
+        lines = iter_todo_lines(path)
+        mark = comment_of(source)
+        if mark:
+            lines = comment_lines(lines, mark)
+        yield from line_records(source, lines, grammar)
+
+
+def scan_note(path, grammar):
+    return list(iter_records([path], grammar))
+
+
+def scan_notes(paths, grammar, workers=1, pool="process"):
+    """
+    same records as iter_records, but with the files sharded across a pool.
+    executor.map hands results back in the order of `paths`,
+    so the rows come out exactly as they would from the serial walk.
+    threads are the better fit for slow (network) mounts where we're waiting on I/O,
+    processes for when the regex work is the bottleneck
+    """
+    if workers <= 1:
+        yield from iter_records(paths, grammar)
+        return
+    executor = ProcessPoolExecutor if pool == "process" else ThreadPoolExecutor
+    chunksize = max(1, len(paths) // (workers * 4))
+    with executor(max_workers=workers) as ex:
+        for records in ex.map(
+            partial(scan_note, grammar=grammar), paths, chunksize=chunksize
+        ):
+            yield from records
+
+
+def to_frame(records, columns, batchsize=10000):
+    """
+    the sink: records only get materialized here, a batch at a time
+    """
+    batches = []
+    while True:
+        batch = list(islice(records, batchsize))
+        if not batch:
+            break
+        batches.append(pd.DataFrame(batch, columns=columns))
+    if not batches:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(batches).reset_index(drop=True)
+
+
+# done.
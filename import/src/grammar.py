@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# vim: set ts=4 sts=0 sw=4 si fenc=utf-8 et:
+# vim: set fdm=marker fmr={{{,}}} fdl=0 foldcolumn=4:
+# Authors:     BP
+# =========================================
+
+# dependencies --- {{{
+import re
+
+import yaml
+
+# }}}
+
+# the 'TODO' mark itself, plus whatever ':'/whitespace follows it.
+# case-sensitive even though the rest of the grammar isn't,
+# and not when it's part of a bigger word like 'TODO-helper'
+MARKER = r"(?<![\w-])(?-i:TODO)(?![\w-])[:\s]*"
+
+
+# Reminder:
+#     parse(line) -> (tags, timelines, task)
+class Grammar:
+    """
+    One compiled alternation of the tag, timeline and TODO-mark patterns,
+    so a single left-to-right scan of the line finds all of them.
+    The patterns can't overlap (tags are in (), timelines in [])
+    so the matches are the same ones re.findall would give for each pattern alone.
+    The task is whatever is left once the tags and the mark are cut out.
+    """
+
+    def __init__(self, tag, timeline, marker=MARKER):
+        self.tag = tag
+        self.timeline = timeline
+        self.marker = marker
+        # group numbers of the content we want back for each alternative,
+        # 0 for patterns without a capture group (then the whole match is used)
+        ntag = re.compile(tag).groups
+        ntimeline = re.compile(timeline).groups
+        self.tag_group = 2 if ntag else 1
+        self.timeline_group = ntag + 3 if ntimeline else ntag + 2
+        self.pattern = re.compile(
+            f"(?P<tag>{tag})|(?P<timeline>{timeline})|(?P<marker>{marker})",
+            flags=re.I,
+        )
+
+    def parse(self, line):
+        clean = line.strip()
+        if clean[:2] == "- ":
+            clean = clean[2:]
+        tags, timelines = [], []
+        cut, pos, marked = [], 0, False
+        for match in self.pattern.finditer(clean):
+            kind = match.lastgroup
+            if kind == "tag":
+                tags.append(match.group(self.tag_group))
+            elif kind == "timeline":
+                timelines.append(match.group(self.timeline_group))
+                continue
+            elif marked:
+                continue
+            else:
+                marked = True
+            cut.append(clean[pos : match.start()])
+            pos = match.end()
+        cut.append(clean[pos:])
+        return tags, timelines, "".join(cut).strip()
+
+    def parse_many(self, lines):
+        parse = self.parse
+        return [parse(line) for line in lines]
+
+
+def from_rules(rulesfile):
+    with open(rulesfile, "r") as f:
+        rules = yaml.safe_load(f)
+    return Grammar(tag=rules["tag"], timeline=rules["timeline"])
+
+
+# done.
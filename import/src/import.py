@@ -6,16 +6,56 @@
 # ---- dependencies {{{
 import argparse
 import logging
-import re
-import subprocess
+import sys
+import time
 from os.path import isdir, isfile
 from pathlib import Path, PosixPath
 from sys import stdout
 
 import pandas as pd
+from extract import line_records, scan_notes, to_frame
+from grammar import from_rules
+from manifest import diff_manifest, read_manifest, write_manifest
+from sources import find_sources
+from watch import get_watcher, tail_note
+
+sys.path.append("../templates")
+from taskindex import clear, connect, index_path
+from tasklog import append, mark_applied, pending
+from taskstore import (
+    FIELDS,
+    STATE,
+    TABLES,
+    compact,
+    count_parts,
+    drop_legacy,
+    filename_of,
+    list_partitions,
+    make_task_id,
+    month_of,
+    normalize,
+    partition_dir,
+    read_legacy,
+    read_partition,
+    set_state,
+    split_rows,
+    sync_index,
+    upsert,
+)
+from timeline import due_of
 
 # }}}
 
+TASK_COLS = [
+    "source",
+    "lineno",
+    "cell",
+    "TODO_line",
+    "tags",
+    "timelines",
+    "task",
+]
+
 
 # ---- support methods {{{
 def get_args():
@@ -25,9 +65,23 @@ def get_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("--input", default=None)
     parser.add_argument("--taskdir", default=None)
+    parser.add_argument("--rules", default="../templates/rules.yml")
+    parser.add_argument("--incremental", action="store_true")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--pool", choices=["process", "thread"], default="process")
+    parser.add_argument("--compact", action="store_true")
+    parser.add_argument("--max-parts", type=int, default=8)
+    parser.add_argument("--by-month", action="store_true")
+    parser.add_argument("--watch", action="store_true")
+    parser.add_argument("--interval", type=float, default=0.5)
+    parser.add_argument("--max-mb", type=float, default=512)
+    parser.add_argument("--scan-code", action="store_true")
     args = parser.parse_args()
     assert Path(args.input).exists()
     assert Path(args.taskdir).exists()
+    assert Path(args.rules).exists()
+    if args.watch:
+        assert isdir(args.input)
     return args
 
 
@@ -50,72 +104,293 @@ def get_logger(sname, file_name=None):
     return logger
 
 
-def read_textlike(fname):
-    """
-    designed for md files (i hardcode '.md' in other places, maybe change the name?)
-    filters for lines with 'TODO' mark
-    probably a more efficient way than list comp but most notes are just daily files
-    so, not worried about too much data loaded on initial file read(s)
-    """
-    with open(fname, "r") as f:
-        lines = [line for line in f.readlines() if "todo" in line.lower()]
-    if all(pd.isna(lines)):
-        return None
-    return lines
-
-
-def prep_notes(arg):
+def prep_notes(arg, code=False):
     if isfile(arg):
-        return PosixPath(arg)
+        return [PosixPath(arg)]
     if isdir(arg):
-        return [path for path in Path(arg).rglob("*.md")]
+        return find_sources(arg, code=code)
     return None
 
 
-def load_input(arg):
-    notes = pd.DataFrame({"source": prep_notes(arg)})
-    notes["filename"] = notes.source.astype(str).apply(lambda x: x[x.rfind("/") + 1 :])
-    logger.info("digesting files")
-    notes["TODO_line"] = notes.source.apply(read_textlike)
-    notes = notes.explode("TODO_line").dropna().reset_index(drop=True)
-    return notes
+def size_guard(paths, max_mb):
+    """
+    keep stray huge files (a dumped log saved as .md, etc.) out of the import.
+    returns the paths to import, and the ones skipped
+    """
+    max_bytes = max_mb * (1 << 20)
+    keep, skipped = [], []
+    for path in paths:
+        if path.stat().st_size > max_bytes:
+            logger.info(f"WARNING: skipping {path}, larger than {max_mb} MB")
+            skipped.append(path)
+            continue
+        keep.append(path)
+    return keep, skipped
+
+
+def place_tables(tables):
+    """
+    what every table needs before it's written: the month partition of each
+    row (its task's note, with --by-month), and the date each timeline means,
+    counted from the date of its note
+    """
+    tasks = tables["tasks"]
+    filenames = filename_of(tasks.source)
+    tasks["month"] = filenames.map(month_of) if args.by_month else None
+    notes = tasks[["task_id", "month"]].assign(filename=filenames)
+    tags = tables["task_tags"].drop(columns="month", errors="ignore")
+    tags = tags.merge(notes[["task_id", "month"]], on="task_id")
+    timelines = tables["task_timelines"].drop(columns="month", errors="ignore")
+    timelines = timelines.merge(notes, on="task_id")
+    timelines["due"] = [
+        due_of(timeline, filename)
+        for timeline, filename in zip(timelines.timeline, timelines.filename)
+    ]
+    return {
+        "tasks": tasks,
+        "task_tags": tags,
+        "task_timelines": timelines.drop(columns="filename"),
+    }
 
 
-def add_tags(df):
-    assert "TODO_line" in df.columns
-    df["tag"] = df.TODO_line.apply(
-        lambda x: re.findall(patterns["tag"], x, flags=re.I) if x else None
+def prep_tasks(notes):
+    """
+    one row per TODO line in tasks, and a row per tag or timeline on it
+    in task_tags and task_timelines (a line with 3 tags and 2 timelines
+    is 1 + 3 + 2 small rows, not 6 copies of the line)
+    """
+    # notebook cell number, <NA> for everything that isn't a notebook
+    notes["cell"] = pd.to_numeric(notes.cell).astype("Int64")
+    notes["source"] = notes.source.astype(str)
+    notes["task_id"] = pd.Series(
+        [
+            make_task_id(source, lineno, task, cell)
+            for source, lineno, task, cell in zip(
+                notes.source, notes.lineno, notes.task, notes.cell
+            )
+        ],
+        index=notes.index,
+        dtype=object,
+    )
+    notes = notes.drop_duplicates(subset="task_id")
+    tasks = notes.reindex(columns=FIELDS["tasks"])
+    tasks[["started", "last_update", "completed"]] = False
+    tags = notes[["task_id", "tags"]].explode("tags").rename(columns={"tags": "tag"})
+    tags["form_tag"] = tags.tag.str.lower()
+    tags = tags.drop_duplicates(subset=TABLES["task_tags"])
+    timelines = notes[["task_id", "timelines"]].explode("timelines")
+    timelines = timelines.rename(columns={"timelines": "timeline"}).dropna()
+    timelines = timelines.drop_duplicates(subset=TABLES["task_timelines"])
+    return place_tables(
+        {
+            "tasks": tasks.astype({"source": "category"}),
+            "task_tags": tags.reindex(columns=FIELDS["task_tags"]),
+            "task_timelines": timelines.reindex(columns=FIELDS["task_timelines"]),
+        }
     )
-    df = df.explode("tag").fillna("untagged")
-    return df
 
 
-def add_timelines(df):
-    df["timeline"] = df.TODO_line.apply(
-        lambda x: re.findall(patterns["timeline"], x, flags=re.I) if x else None
+def line_of(source, lineno, cell):
+    """
+    where a TODO line is: its note (or script), line, and notebook cell.
+    None for a line or cell that isn't known (a task migrated from a store
+    that didn't keep line numbers, or one that isn't in a notebook)
+    """
+    return tuple(
+        [str(source)]
+        + [None if pd.isna(value) else int(value) for value in (lineno, cell)]
     )
-    df = df.explode("timeline")
-    return df
 
 
-def clean_TODO(line):
-    clean = line.replace("[^-]TODO[^-][:\s]*", "").strip()
-    if clean[:2] == "- ":
-        clean = clean[2:]
-    return clean
+def lifecycle_events(live, tasks, retired):
+    """
+    what this import did to each task, for the event log (see tasklog.py):
+    a TODO line that wasn't there before is created, one whose line changed
+    (a tag added, say) but not its task_id is updated, and one gone from
+    a re-scanned note is completed (the TODO was deleted or marked DONE).
+    a gone task and a new one with the same text are one TODO that moved
+    (lines added above it, or cut and pasted into another note); what's left
+    of them on the same line of the same note is one TODO whose text was
+    edited, which is updated too. both keep the gone task's state
+    """
+    new = tasks.loc[~tasks.task_id.isin(live.task_id).values]
+    gone = live.loc[
+        live.source.isin(retired).values & ~live.task_id.isin(tasks.task_id).values
+    ]
+    both = tasks[["task_id", "task", "TODO_line"]].merge(
+        live[["task_id", "TODO_line"]], on="task_id", suffixes=("", "_was")
+    )
+    updated = both.loc[both.TODO_line != both.TODO_line_was]
+    was, at = {}, {}
+    for task_id, task, *where in zip(
+        gone.task_id, gone.task, gone.source, gone.lineno, gone.cell
+    ):
+        was.setdefault(normalize(task), []).append(task_id)
+        if line_of(*where)[1] is not None:
+            at[line_of(*where)] = task_id
+    # moves first, so a TODO that moved isn't taken for an edit of another
+    found, taken = {}, set()
+    for task_id, task in zip(new.task_id, new.task):
+        if was.get(normalize(task)):
+            found[task_id] = ("moved", was[normalize(task)].pop(0))
+            taken.add(found[task_id][1])
+    for task_id, *where in zip(new.task_id, new.source, new.lineno, new.cell):
+        old = at.get(line_of(*where))
+        if (task_id not in found) and (old is not None) and (old not in taken):
+            found[task_id] = ("updated", old)
+            taken.add(old)
+    events = []
+    for task_id, source, lineno, task, line, *state in zip(
+        new.task_id,
+        new.source,
+        new.lineno,
+        new.task,
+        new.TODO_line,
+        *(new[col] for col in STATE),
+    ):
+        source, lineno, _ = line_of(source, lineno, None)
+        where = {"source": source, "lineno": lineno, "task": task}
+        if task_id in found:
+            kind, old = found[task_id]
+            extra = {"TODO_line": line} if kind == "updated" else {}
+            events.append(
+                {"event": kind, "task_id": task_id, "from": old, **where, **extra}
+            )
+            continue
+        events.append({"event": "created", "task_id": task_id, **where})
+        # only a store being migrated brings tasks in with a state already
+        events += [
+            {"event": kind, "task_id": task_id}
+            for kind, on in zip(["started", "updated", "completed"], state)
+            if on
+        ]
+    events += [
+        {"event": "updated", "task_id": task_id, "task": task, "TODO_line": line}
+        for task_id, task, line in zip(updated.task_id, updated.task, updated.TODO_line)
+    ]
+    events += [
+        {"event": "completed", "task_id": task_id, "task": task}
+        for task_id, task in zip(gone.task_id, gone.task)
+        if task_id not in taken
+    ]
+    return events
+
+
+def write_tasks(tables, retired):
+    """
+    upsert every table in every partition with new rows, plus any that might hold
+    tasks from `retired` notes (only the retired notes' months, when partitioned by month).
+    what changed goes to the event log first, and the state the log gives every
+    task with new events (from this import, or `todo start/done` since the last)
+    is put on the store. all three tables share a partition,
+    and the index is synced once per partition
+    """
+    if args.by_month:
+        months = sorted(set(tables["tasks"].month))
+        retired_months = {month_of(Path(source).name) for source in retired}
+        months += [
+            month
+            for month in (
+                list_partitions(args.taskdir, months=retired_months) if retired else []
+            )
+            if month not in months
+        ]
+    else:
+        months = [None] if (not tables["tasks"].empty) or retired else []
+    cols = ["task_id", "source", "lineno", "cell", "task", "TODO_line"]
+    lives = {
+        month: read_partition(partition_dir(args.taskdir, "tasks", month), columns=cols)
+        for month in months
+    }
+    live = pd.concat(lives.values()) if lives else pd.DataFrame(columns=cols)
+    events = lifecycle_events(live, tables["tasks"], retired)
+    append(args.taskdir, events)
+    if events:
+        kinds = pd.Series([event["event"] for event in events]).value_counts()
+        logger.info(
+            f"{len(events)} events: "
+            + ", ".join(f"{n} {kind}" for kind, n in kinds.items())
+        )
+    for month in months:
+        live = lives[month]
+        retired_ids = set(live.task_id[live.source.isin(retired).values])
+        for table, rows in tables.items():
+            pdir = partition_dir(args.taskdir, table, month)
+            subset = rows if month is None else rows.loc[rows.month == month]
+            n_written, n_retired = upsert(pdir, subset, retired_ids)
+            logger.info(
+                f"{subset.shape[0]} rows for {pdir}: "
+                f"{n_written} new or changed, {n_retired} retired"
+            )
+    states, offset = pending(args.taskdir)
+    for month in list_partitions(args.taskdir) if states else []:
+        n_state = set_state(partition_dir(args.taskdir, "tasks", month), states)
+        if n_state:
+            logger.info(f"state of {n_state} tasks updated in {month or 'tasks'}")
+            months += [] if month in months else [month]
+    for month in months:
+        # before compacting, so the index can replay the new parts
+        sync_index(index, args.taskdir, month)
+        for table in tables:
+            pdir = partition_dir(args.taskdir, table, month)
+            if args.compact or (count_parts(pdir) > args.max_parts):
+                logger.info(f"compacting {pdir}")
+                compact(pdir)
+    if states:
+        mark_applied(args.taskdir, offset)
+    return 1
 
 
-def exists_or_mkdir(path):
+def migrate_store(taskdir):
     """
-    need to be able to create new dirs for new tags
+    a store from before tasks were split into three tables (or were
+    partitioned at all, TASKDIR/<tag>/) is moved over
+    (keeping every task's state) the first time it's imported into,
+    and the index is rebuilt from the new tables
     """
-    if not Path(path).exists():
-        logger.info(f"{path} does not exist. Adding now...")
-        subprocess.call(["mkdir", path])
-        logger.info("added path.")
+    legacy = read_legacy(taskdir)
+    if legacy is None:
+        return 0
+    logger.info(
+        f"moving {legacy.shape[0]} rows to the tasks/task_tags/task_timelines tables"
+    )
+    clear(index)
+    write_tasks(place_tables(split_rows(legacy)), [])
+    drop_legacy(taskdir)
     return 1
 
 
+def watch_notes(root, manifest, manifestpath):
+    """
+    keep importing as notes change: appended lines are tailed from the
+    last offset seen (see watch.tail_note), anything else is re-scanned
+    """
+    watcher = get_watcher(root)
+    logger.info(f"watching {root} ({type(watcher).__name__})")
+    while True:
+        changed = {
+            str(Path(path))
+            for path in watcher.read(timeout=args.interval)
+            if path.endswith(".md")
+        }
+        if not changed:
+            continue
+        records, retired = [], []
+        for path in sorted(changed):
+            if not Path(path).exists():
+                manifest.pop(path, None)
+                retired.append(path)
+                continue
+            lines, manifest[path], rescan = tail_note(path, manifest.get(path))
+            if rescan:
+                retired.append(path)
+            records += list(line_records(path, lines, grammar))
+        logger.info(f"{len(records)} new TODO records from {len(changed)} notes")
+        notes = to_frame(iter(records), columns=TASK_COLS)
+        write_tasks(prep_tasks(notes), retired)
+        write_manifest(manifestpath, manifest)
+
+
 # }}}
 
 # ---- main {{{
@@ -126,58 +401,50 @@ if __name__ == "__main__":
     logger = get_logger(__name__, f"{args.taskdir}/import.log")
 
     # re
-    patterns = {
-        "tag": "\(([a-z0-9\-\_]+)\)",
-        "timeline": "\[(by[a-z0-9:\s\/\-]*|before[a-z0-9:\s\/\-]*)\]",
-    }
+    grammar = from_rules(args.rules)
     # }}}
 
     # core routine --- {{{
     logger.info("loading args")
-    notes = load_input(args.input)
-
-    logger.info("applying minor fixes to legacy notes")
-    notes.TODO_line = notes.TODO_line.str.replace("[tech]", "(tech)", regex=False)
-
-    logger.info("capturing TODO tags")
-    notes = add_tags(notes)
-    assert "tag" in notes.columns
-
-    logger.info("capturing TODO timelines")
-    notes = add_timelines(notes)
-
-    notes["task"] = notes.TODO_line.apply(clean_TODO)
-    notes.task = notes.task.str.replace(patterns["tag"], "", regex=True, flags=re.I)
-    notes[["started", "last_update", "completed"]] = False
+    paths, skipped = size_guard(
+        prep_notes(args.input, code=args.scan_code), args.max_mb
+    )
+    manifestpath = f"{args.taskdir}/manifest.json"
+    changed, deleted, manifest = diff_manifest(
+        paths, read_manifest(manifestpath), root=args.input, skipped=skipped
+    )
+    retired = [str(path) for path in changed] + deleted
+    if args.incremental:
+        logger.info(
+            f"{len(changed)} new or changed, {len(deleted)} deleted of {len(paths)} notes"
+        )
+        paths = changed
+    logger.info(f"digesting files with {args.workers} {args.pool} worker(s)")
+    start = time.perf_counter()
+    notes = to_frame(
+        scan_notes(paths, grammar, workers=args.workers, pool=args.pool),
+        columns=TASK_COLS,
+    )
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"{notes.shape[0]} TODO records found in {len(paths)} files "
+        f"({len(paths) / max(elapsed, 1e-9):.1f} files/s)"
+    )
     # }}}
 
     # outputting tasks --- {{{
     logger.info("preparing to write tasks")
-    notes["form_tag"] = notes.tag.str.lower()
-    notes["tagpath"] = notes.form_tag.apply(
-        lambda form_tag: f"{args.taskdir}/{form_tag}"
-    )
-    assert (
-        notes.tagpath.value_counts().head(1).values
-        == notes.form_tag.value_counts().head(1).values
-    )
-    assert notes.tagpath.apply(exists_or_mkdir).all()
-
-    # TODO: make it so it doesn't overwrite existing dfs?
-    # also TODO: this script could be modified to scan non-note files (like scripts) for TODOs
-    notes.source = notes.source.astype(str)
-    for form_tag in notes.form_tag.unique():
-        logger.info(f"writing for tag:\t{form_tag}")
-        subset = notes.loc[notes.form_tag == form_tag]
-        logger.info(f"{subset.shape[0]} TODO records tagged {form_tag}")
-        writepath = f"{subset.tagpath.values[0]}/todo.parquet"
-        if isfile(writepath):
-            logger.info(
-                f"WARNING: {writepath} already exists and is being overwritten."
-            )
-        subset.drop(columns="tagpath").to_parquet(writepath)
+    index = connect(index_path(args.taskdir))
+    migrate_store(args.taskdir)
+    # catches the index up with whatever was imported while it wasn't kept
+    for month in list_partitions(args.taskdir):
+        sync_index(index, args.taskdir, month)
+    write_tasks(prep_tasks(notes), retired)
     # }}}
 
+    write_manifest(manifestpath, manifest)
+    if args.watch:
+        watch_notes(args.input, manifest, manifestpath)
     logger.info("done.")
 
 # }}}
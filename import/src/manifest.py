@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# vim: set ts=4 sts=0 sw=4 si fenc=utf-8 et:
+# vim: set fdm=marker fmr={{{,}}} fdl=0 foldcolumn=4:
+# Authors:     BP
+# =========================================
+
+# dependencies --- {{{
+import hashlib
+import json
+import os
+from pathlib import Path
+
+# }}}
+
+
+# Reminder:
+#     manifest = {path: {'mtime': float, 'size': int, 'sha1': str}}
+def stat_note(fname):
+    info = os.stat(fname)
+    return {"mtime": info.st_mtime, "size": info.st_size}
+
+
+def hash_note(fname, blocksize=1 << 20):
+    """
+    sha1 of the file contents, read in blocks so big files don't get loaded at once
+    """
+    hash_obj = hashlib.sha1()
+    with open(fname, "rb") as f:
+        for block in iter(lambda: f.read(blocksize), b""):
+            hash_obj.update(block)
+    return str(hash_obj.hexdigest())
+
+
+def read_manifest(fname):
+    if not Path(fname).exists():
+        return {}
+    with open(fname, "r") as f:
+        data = json.load(f)
+    return data
+
+
+def write_manifest(fname, manifest):
+    """
+    write to a temp file first and rename it into place,
+    so an interrupted import can't leave a half-written manifest behind
+    """
+    tmp = f"{fname}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, sort_keys=True, indent=1)
+    os.replace(tmp, fname)
+    return 1
+
+
+def under(key, root):
+    """
+    whether the note at `key` is `root` or somewhere below it
+    """
+    path = Path(key).resolve()
+    return (path == root) or (root in path.parents)
+
+
+def diff_manifest(paths, manifest, root=None, skipped=()):
+    """
+    compare the files on disk to what was seen on the last run.
+    the cheap check is mtime + size; only files that fail it get hashed,
+    and a file is only re-scanned if its contents actually changed
+    (so a `touch` or a checkout doesn't cost a re-scan).
+    only notes under `root` (the --input of this run) can have been deleted,
+    and `skipped` ones (there, but left out of this run) aren't;
+    every other entry stays in the manifest as it was
+
+    returns (changed, deleted, updated manifest)
+    """
+    changed = []
+    updated = {}
+    for path in paths:
+        key = str(path)
+        stat = stat_note(path)
+        known = manifest.get(key)
+        if known and (known["mtime"] == stat["mtime"]) & (
+            known["size"] == stat["size"]
+        ):
+            updated[key] = known
+            continue
+        stat["sha1"] = hash_note(path)
+        updated[key] = stat
+        if known and known.get("sha1") == stat["sha1"]:
+            continue
+        changed.append(path)
+    root = Path(root).resolve() if root else None
+    kept = {str(path) for path in skipped}
+    deleted = [
+        key
+        for key in manifest
+        if (key not in updated)
+        and (key not in kept)
+        and ((root is None) or under(key, root))
+    ]
+    gone = set(deleted)
+    rest = {key: known for key, known in manifest.items() if key not in gone}
+    return changed, deleted, {**rest, **updated}
+
+
+# done.
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# vim: set ts=4 sts=0 sw=4 si fenc=utf-8 et:
+# vim: set fdm=marker fmr={{{,}}} fdl=0 foldcolumn=4:
+# Authors:     BP
+# =========================================
+
+# dependencies --- {{{
+import os
+import subprocess
+from pathlib import Path
+
+from extract import comment_of
+
+# }}}
+
+# never worth descending into, repo or not
+SKIP_DIRS = {".git", ".ipynb_checkpoints"}
+
+
+def is_code(fname):
+    name = os.path.basename(fname)
+    return name.endswith(".ipynb") or (comment_of(name) is not None)
+
+
+def git_files(repo):
+    """
+    every file git would consider part of `repo` (tracked, or untracked but not ignored),
+    so .gitignore is respected without having to parse it here.
+    None if `repo` isn't inside a git work tree
+    """
+    try:
+        out = subprocess.run(
+            [
+                "git",
+                "-C",
+                str(repo),
+                "ls-files",
+                "-z",
+                "--cached",
+                "--others",
+                "--exclude-standard",
+            ],
+            capture_output=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return [Path(repo, name) for name in os.fsdecode(out).split("\0") if name]
+
+
+def code_files(root):
+    """
+    scripts and notebooks under `root`. inside a git repo the file list
+    comes from git, so .gitignore is respected; elsewhere (e.g. a directory
+    holding many repos, or one git ignores) it's a plain walk that hands
+    over to git at every repo it finds
+    """
+    found = git_files(root)
+    if not found:
+        found = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            if (".git" in dirnames) or (".git" in filenames):
+                found += git_files(dirpath) or []
+                dirnames[:] = []
+                continue
+            dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+            found += [Path(dirpath, f) for f in sorted(filenames)]
+    return [
+        path
+        for path in found
+        if is_code(path) and SKIP_DIRS.isdisjoint(path.parts) and path.is_file()
+    ]
+
+
+def find_sources(root, code=False):
+    """
+    notes (and with `code`, scripts and notebooks) under `root`.
+    notes are every .md file, gitignored or not, as they always were;
+    only the code files go through git
+    """
+    notes = [path for path in Path(root).rglob("*.md")]
+    return notes + code_files(root) if code else notes
+
+
+# done.
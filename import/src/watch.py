@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# vim: set ts=4 sts=0 sw=4 si fenc=utf-8 et:
+# vim: set fdm=marker fmr={{{,}}} fdl=0 foldcolumn=4:
+# Authors:     BP
+# =========================================
+
+# dependencies --- {{{
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import select
+import struct
+import time
+from pathlib import Path
+
+from extract import iter_lines_from
+from manifest import stat_note
+
+# }}}
+
+# see `man 7 inotify`
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCHED = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+WATCHED |= IN_DELETE
+EVENT = struct.Struct("iIII")
+# bytes before the last-seen offset that have to be unchanged for a file to be tailed
+EDGE = 64
+
+
+class INotify:
+    """
+    Just enough of inotify (through libc, no extra dependency) to hear about
+    every change under a notes directory. One watch per directory,
+    directories created later get their own watch as they show up.
+    Raises OSError/AttributeError where inotify isn't there (e.g. macOS),
+    which is the cue to poll instead.
+    """
+
+    def __init__(self, root):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.wds = {}
+        self.add_tree(root)
+
+    def add_tree(self, root):
+        found = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), WATCHED)
+            if wd >= 0:
+                self.wds[wd] = dirpath
+            found += [f"{dirpath}/{f}" for f in filenames]
+        return found
+
+    def read(self, timeout):
+        """
+        paths touched since the last call, waiting up to `timeout` seconds for the first
+        """
+        changed = set()
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return changed
+        data = os.read(self.fd, 1 << 16)
+        pos = 0
+        while pos < len(data):
+            wd, mask, cookie, size = EVENT.unpack_from(data, pos)
+            pos += EVENT.size
+            name = data[pos : pos + size].rstrip(b"\0").decode()
+            pos += size
+            path = f"{self.wds.get(wd, '')}/{name}"
+            if (mask & IN_ISDIR) and (mask & (IN_CREATE | IN_MOVED_TO)):
+                changed.update(self.add_tree(path))
+            elif name:
+                changed.add(path)
+        return changed
+
+
+class Poller:
+    """
+    the fallback: stat (never read) every note every `interval` seconds
+    """
+
+    def __init__(self, root, pattern):
+        self.root = root
+        self.pattern = pattern
+        self.seen = self.snapshot()
+
+    def snapshot(self):
+        seen = {}
+        for path in Path(self.root).rglob(self.pattern):
+            try:
+                info = path.stat()
+            except FileNotFoundError:
+                continue
+            seen[str(path)] = (info.st_mtime_ns, info.st_size)
+        return seen
+
+    def read(self, timeout):
+        time.sleep(timeout)
+        now = self.snapshot()
+        changed = {path for path, info in now.items() if self.seen.get(path) != info}
+        changed.update(path for path in self.seen if path not in now)
+        self.seen = now
+        return changed
+
+
+def get_watcher(root, pattern="*.md"):
+    try:
+        return INotify(root)
+    except (OSError, AttributeError, TypeError):
+        return Poller(root, pattern)
+
+
+def edge_hash(fname, offset):
+    with open(fname, "rb") as f:
+        f.seek(max(0, offset - EDGE))
+        edge = f.read(min(offset, EDGE))
+    return str(hashlib.sha1(edge).hexdigest())
+
+
+def tail_note(fname, entry):
+    """
+    what's new in `fname` since `entry` (its manifest entry) was written.
+    if the file only grew and the bytes just before the old offset are the same,
+    only the appended lines are read and nothing needs retiring;
+    anything else (new, truncated, edited in place) reads from the top.
+
+    returns (TODO lines as (lineno, line), new manifest entry, whether rows retire)
+    """
+    stat = stat_note(fname)
+    offset, lineno = 0, 0
+    if entry and ("offset" in entry) and (stat["size"] >= entry["offset"]):
+        if edge_hash(fname, entry["offset"]) == entry["edge"]:
+            offset, lineno = entry["offset"], entry["nlines"]
+    rescan = offset == 0
+    lines = []
+    for lineno, line, offset in iter_lines_from(fname, offset=offset, lineno=lineno):
+        if "todo" in line.lower():
+            lines.append((lineno, line))
+    # a tailed file's full sha1 isn't known without reading the whole thing,
+    # so the next batch import will hash it again
+    stat.update(sha1=None, offset=offset, nlines=lineno, edge=edge_hash(fname, offset))
+    return lines, stat, rescan
+
+
+# done.
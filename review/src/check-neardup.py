@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# vim: set ts=4 sts=0 sw=4 si fenc=utf-8 et:
+# vim: set fdm=marker fmr={{{,}}} fdl=0 foldcolumn=4:
+# Authors:     BP
+# =========================================
+
+# dependencies --- {{{
+import argparse
+from pathlib import Path
+
+import yaml
+from neardup import cluster_tasks
+
+# }}}
+
+
+# support methods {{{
+def get_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default="hand/neardup-corpus.yml")
+    args = parser.parse_args()
+    assert Path(args.corpus).exists()
+    return args
+
+
+def read_yaml(fname):
+    with open(fname, "r") as f:
+        out = yaml.safe_load(f)
+    return out
+
+
+# }}}
+
+# main --- {{{
+if __name__ == "__main__":
+    args = get_args()
+    corpus = read_yaml(args.corpus)
+
+    for case in corpus:
+        task_ids = [f"t{i}" for i in range(len(case["tasks"]))]
+        clusters = cluster_tasks(task_ids, case["tasks"])
+        expected = [task_ids[0]] * len(task_ids) if case["same"] else task_ids
+        assert clusters == expected, (case["tasks"], clusters)
+    print(f"{len(corpus)} corpus groups cluster as expected")
+# }}}
@@ -6,17 +6,24 @@
 # ---- dependencies {{{
 import argparse
 import hashlib
+import json
 import logging
+import os
 import subprocess
+from concurrent.futures import ProcessPoolExecutor
 from os import listdir
 from pathlib import Path
 from sys import stdout
 
 import pandas as pd
 import yaml
+from neardup import cluster_tasks
 
 # }}}
 
+# libyaml's loader when pyyaml was built with it, several times faster
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 
 # ---- support methods {{{
 def initial_asserts():
@@ -27,6 +34,7 @@ def get_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("--input", default=None)
     parser.add_argument("--output", default=None)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
     args = parser.parse_args()
     assert Path(args.input).exists()
     return args
@@ -50,7 +58,71 @@ def get_logger(sname, file_name=None):
 
 def read_yaml(fname):
     with open(fname, "r") as f_handle:
-        out = yaml.safe_load(f_handle)
+        out = yaml.load(f_handle, Loader=Loader)
+    return out
+
+
+# Reminder:
+#     TAG/.todo.yml.cache = {"mtime": float, "size": int, "sha1": str, "data": [...]}
+def cache_path(fname):
+    fname = Path(fname)
+    return fname.parent / f".{fname.name}.cache"
+
+
+def read_cache(fname):
+    """
+    the parsed contents of `fname` from its sidecar, if the file hasn't changed.
+    mtime + size is checked first, the hash only when those differ
+    (so a `touch` or a checkout doesn't cost a re-parse)
+
+    returns (data or None, sidecar entry for the file as it is now)
+    """
+    info = os.stat(fname)
+    entry = {"mtime": info.st_mtime, "size": info.st_size}
+    try:
+        with open(cache_path(fname), "r") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = {}
+    if (cached.get("mtime"), cached.get("size")) == (entry["mtime"], entry["size"]):
+        return cached["data"], cached
+    with open(fname, "rb") as f:
+        entry["sha1"] = str(hashlib.sha1(f.read()).hexdigest())
+    if cached.get("sha1") == entry["sha1"]:
+        write_cache(fname, entry, cached["data"])
+        return cached["data"], entry
+    return None, entry
+
+
+def write_cache(fname, entry, data):
+    tmp = f"{cache_path(fname)}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({**entry, "data": data}, f, separators=(",", ":"))
+    os.replace(tmp, cache_path(fname))
+    return 1
+
+
+def load_yamls(fnames, workers=1):
+    """
+    every file's parsed contents, in order. unchanged files come from their sidecar,
+    the rest are parsed (across processes, when there's more than one)
+    and their sidecars rewritten
+    """
+    cached = [read_cache(fname) for fname in fnames]
+    stale = [i for i, (data, _) in enumerate(cached) if data is None]
+    if (workers > 1) and (len(stale) > 1):
+        with ProcessPoolExecutor(max_workers=min(workers, len(stale))) as ex:
+            parsed = list(ex.map(read_yaml, [fnames[i] for i in stale]))
+    else:
+        parsed = [read_yaml(fnames[i]) for i in stale]
+    out = [data for data, _ in cached]
+    for i, data in zip(stale, parsed):
+        out[i] = data if data else []
+        entry = cached[i][1]
+        info = os.stat(fnames[i])
+        # only if the file didn't change again while it was being parsed
+        if (info.st_mtime, info.st_size) == (entry["mtime"], entry["size"]):
+            write_cache(fnames[i], entry, out[i])
     return out
 
 
@@ -64,36 +136,41 @@ def collect_task_fs(task_dir):
     return [
         (tag, f"{task_dir}{tag}/{f}")
         for tag in listdir(task_dir)
-        if ".log" not in tag
+        if Path(task_dir, tag).is_dir()
         for f in listdir(task_dir + tag)
-        if ".yml" in f
+        if f.endswith(".yml")
     ]
 
 
-def fillin_tasks(task_dir):
+# Reminder:
+#     task_df = one row per (task_id, tag), long format.
+# a task in n tag files is n rows, instead of a column per tag for every task
+def fillin_tasks(task_dir, workers=1):
     assert Path(task_dir).exists()
     task_lib = collect_task_fs(task_dir)
-    task_dfs = []
-    for tag, f in task_lib:
-        tag_tasks = read_yaml(f)
-        df = pd.DataFrame(tag_tasks, columns=["task"])
-        df[tag] = 1
-        task_dfs.append(df)
-    out = pd.concat(task_dfs).fillna(0)
+    tag_tasks = load_yamls([f for _, f in task_lib], workers=workers)
+    rows = []
+    for (tag, _), tasks in zip(task_lib, tag_tasks):
+        rows += [(task, tag) for task in tasks]
+    out = pd.DataFrame(rows, columns=["task", "tag"])
     out["task_id"] = out.task.apply(get_hash)
-    return out.reset_index().drop(columns="index")
+    out["tag"] = out.tag.astype("category")
+    return out[["task_id", "tag", "task"]]
 
 
 def find_mult_tags(task_df):
-    tag_cols = [col for col in task_df.columns if "task" not in col]
-    if (any(task_df[tag_cols].sum(axis=1) > 1)) | (
-        any(task_df.duplicated(subset="task_id"))
-    ):
+    """
+    one group-count over task_id: more distinct tags than one is a multi-tag task,
+    more rows than distinct tags is the same task listed twice under a tag
+    """
+    counts = task_df.groupby("task_id", observed=True).tag.agg(["size", "nunique"])
+    mult = counts["nunique"] > 1
+    dups = counts["size"] > counts["nunique"]
+    if mult.any() | dups.any():
         print("tasks with multiple labels found")
     else:
         print("no tasks found with multiple labels assigned")
-    task_is = task_df.loc[task_df[tag_cols].sum(axis=1) > 1].index.values
-    task_ids = task_df.loc[task_df.index.isin(task_is), "task_id"].values
+    task_ids = counts.index[mult].values
     return task_ids
 
 
@@ -109,12 +186,23 @@ if __name__ == "__main__":
     args = get_args()
 
     # setup logging
-    logger = get_logger(__name__, f"{args.output}/collect_active.log")
+    logger = get_logger(__name__, f"{Path(args.output).parent}/collect_active.log")
 
     # do the thing
-    task_df = fillin_tasks(args.input)
+    task_df = fillin_tasks(args.input, workers=args.workers)
     mult_tags = find_mult_tags(task_df)
+    logger.info(f"{len(mult_tags)} tasks with multiple tags")
+    # near-duplicates (the same TODO reworded across notes) share a cluster_id
+    task_df["cluster_id"] = cluster_tasks(task_df.task_id, task_df.task)
+    sizes = task_df.groupby("cluster_id").task_id.nunique()
+    logger.info(
+        f"{(sizes > 1).sum()} clusters of near-duplicate tasks "
+        f"({sizes[sizes > 1].sum()} tasks)"
+    )
 
+    # sorted by tag so a filter on tag only touches its own run of rows
+    task_df = task_df.drop_duplicates(subset=["task_id", "tag"])
+    task_df = task_df.sort_values(["tag", "task_id"]).reset_index(drop=True)
     task_df.to_parquet(args.output)
     logger.info("done.")
 
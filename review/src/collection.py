@@ -0,0 +1,100 @@
+# vim: set ts=4 sts=0 sw=4 si fenc=utf-8 et:
+# vim: set fdm=marker fmr={{{,}}} fdl=0 foldcolumn=4:
+# Authors:     BP
+# =========================================
+
+# ---- dependencies {{{
+import os
+from collections import Counter
+from pathlib import Path
+
+import yaml
+
+# }}}
+
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+Dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+
+# Reminder:
+#     WRITE_PATH/<tag>/todo.yml    open tasks, a yaml list of strings
+#     WRITE_PATH/<tag>/todo.done   finished tasks, same format
+# ---- support methods {{{
+def read_list(fname):
+    if not Path(fname).exists():
+        return []
+    with open(fname, "r") as f:
+        out = yaml.load(f, Loader=Loader)
+    return out if out else []
+
+
+def write_list(fname, items):
+    """
+    the new contents go to a temp file in the same directory, which is
+    renamed over the old one: readers see either the old list or the new one
+    """
+    tmp = f"{fname}.tmp"
+    with open(tmp, "w") as f:
+        if items:
+            yaml.dump(
+                items,
+                f,
+                Dumper=Dumper,
+                default_flow_style=False,
+                allow_unicode=True,
+                width=1 << 16,
+            )
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, fname)
+    return 1
+
+
+def load_collection(writepath, tags=None):
+    """
+    every open task as (tag, task), read once
+    """
+    items = []
+    for tagdir in sorted(Path(writepath).iterdir()):
+        if (not tagdir.is_dir()) or ((tags is not None) and (tagdir.name not in tags)):
+            continue
+        items += [(tagdir.name, task) for task in read_list(tagdir / "todo.yml")]
+    return items
+
+
+def commit_done(writepath, done):
+    """
+    move the (tag, task) pairs in `done` from todo.yml to todo.done,
+    with one rewrite of each file per tag however many tasks moved.
+    todo.done is written first: if anything stops in between,
+    a task can be in both files but never in neither
+
+    returns {tag: number of tasks moved}
+    """
+    by_tag = {}
+    for tag, task in done:
+        by_tag.setdefault(tag, []).append(task)
+    moved = {}
+    for tag, tasks in by_tag.items():
+        tagdir = Path(writepath, tag)
+        todo = read_list(tagdir / "todo.yml")
+        # as many copies as were marked done, so a task that's in todo.yml
+        # twice and was finished once keeps its other copy
+        finished = Counter(tasks)
+        keep, gone = [], []
+        for task in todo:
+            if finished[task] > 0:
+                finished[task] -= 1
+                gone.append(task)
+            else:
+                keep.append(task)
+        if not gone:
+            continue
+        write_list(tagdir / "todo.done", read_list(tagdir / "todo.done") + gone)
+        write_list(tagdir / "todo.yml", keep)
+        moved[tag] = len(gone)
+    return moved
+
+
+# }}}
+# done.
@@ -0,0 +1,148 @@
+# vim: set ts=4 sts=0 sw=4 si fenc=utf-8 et:
+# vim: set fdm=marker fmr={{{,}}} fdl=0 foldcolumn=4:
+# Authors:     BP
+# =========================================
+
+# ---- dependencies {{{
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[2] / "templates"))
+from taskstore import normalize
+
+# }}}
+
+# MinHash over character shingles, banded LSH to find candidate pairs.
+# 16 bands of 4 rows puts the LSH threshold around jaccard 0.5, so pairs well
+# below MIN_SIMILARITY still become candidates; only those whose signatures
+# agree on at least MIN_SIMILARITY - SLACK (64 perms estimate jaccard to about
+# +-0.05) are checked against their actual shingles, and merged if their
+# jaccard is MIN_SIMILARITY or more. 0.85 keeps typos, case and punctuation
+# together but not the same task for two files ("clean.py apply ts advice..."
+# vs "import.r apply ts advice...") or two functions (initial_/final_asserts())
+NUM_PERM = 64
+BANDS = 16
+MIN_SIMILARITY = 0.85
+SLACK = 0.1
+# shingles hashed per batch, so the (perm x shingle) matrix stays ~100MB
+CHUNK = 1 << 18
+
+
+# ---- support methods {{{
+def shingles(tasks):
+    """
+    every byte 3-gram of every (normalized) task as one int array,
+    plus where each task's run of shingles starts.
+    tasks are joined with two NULs after each, so a task shorter than 3 bytes
+    still gets a (padded) shingle and no shingle spans two tasks
+    """
+    texts = [normalize(task).encode() for task in tasks]
+    lengths = np.array([len(text) for text in texts], dtype=np.int64)
+    buf = np.frombuffer(b"\0\0".join(texts) + b"\0\0", dtype=np.uint8)
+    buf = buf.astype(np.uint64)
+    counts = np.maximum(lengths - 2, 1)
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    starts = np.concatenate([[0], np.cumsum(lengths + 2)[:-1]])
+    pos = np.repeat(starts - offsets, counts) + np.arange(counts.sum())
+    grams = (buf[pos] << 16) | (buf[pos + 1] << 8) | buf[pos + 2]
+    return grams, offsets
+
+
+def signatures(grams, offsets, num_perm=NUM_PERM, seed=1):
+    """
+    MinHash signatures, one row per task: the min of each of `num_perm`
+    multiply-shift hashes ((a*x + b) mod 2**64, top 32 bits) over the task's
+    shingles (as shingles() returns them). tasks are done in batches
+    with reduceat instead of one at a time
+    """
+    rng = np.random.default_rng(seed)
+    a = (rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64) << 1) | 1
+    b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+    ends = np.append(offsets[1:], len(grams))
+    sigs = np.empty((len(offsets), num_perm), dtype=np.uint32)
+    start = 0
+    while start < len(offsets):
+        stop = max(start + 1, int(np.searchsorted(ends, offsets[start] + CHUNK)))
+        x = grams[offsets[start] : ends[stop - 1]]
+        hashed = ((a[:, None] * x[None, :] + b[:, None]) >> np.uint64(32)).astype(
+            np.uint32
+        )
+        sigs[start:stop] = np.minimum.reduceat(
+            hashed, offsets[start:stop] - offsets[start], axis=1
+        ).T
+        start = stop
+    return sigs
+
+
+def find_root(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def jaccard(grams, offsets, i, j, sets):
+    """
+    the actual jaccard similarity of tasks i and j over their shingles;
+    `sets` keeps each task's distinct shingles once worked out
+    """
+    for k in (i, j):
+        if k not in sets:
+            stop = offsets[k + 1] if k + 1 < len(offsets) else len(grams)
+            sets[k] = np.unique(grams[offsets[k] : stop])
+    shared = len(np.intersect1d(sets[i], sets[j], assume_unique=True))
+    return shared / (len(sets[i]) + len(sets[j]) - shared)
+
+
+def lsh_clusters(sigs, grams, offsets, bands=BANDS, min_similarity=MIN_SIMILARITY):
+    """
+    cluster label per row. within each band, rows with the same slice of signature
+    land in one bucket; each row is compared to its bucket's first row only,
+    so the work grows with the number of rows, not the number of pairs.
+    a pair is only merged once its actual jaccard is checked, so an
+    overestimate from the signatures can't chain unrelated tasks together
+    """
+    n, num_perm = sigs.shape
+    rows = num_perm // bands
+    parent = np.arange(n)
+    sets, checked = {}, set()
+    for band in range(bands):
+        keys = np.ascontiguousarray(sigs[:, band * rows : (band + 1) * rows])
+        keys = keys.view(np.dtype((np.void, keys.dtype.itemsize * rows))).ravel()
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        heads = first[inverse.ravel()]
+        cand = np.flatnonzero(heads != np.arange(n))
+        if not len(cand):
+            continue
+        estimate = (sigs[cand] == sigs[heads[cand]]).mean(axis=1)
+        likely = estimate >= min_similarity - SLACK
+        for i, j in zip(cand[likely], heads[cand][likely]):
+            ri, rj = find_root(parent, i), find_root(parent, j)
+            if (ri == rj) or ((i, j) in checked):
+                continue
+            checked.add((i, j))
+            if jaccard(grams, offsets, i, j, sets) >= min_similarity:
+                parent[max(ri, rj)] = min(ri, rj)
+    return np.array([find_root(parent, i) for i in range(n)])
+
+
+def cluster_tasks(task_ids, tasks):
+    """
+    near-duplicate cluster for each task: the smallest task_id among
+    the tasks it's clustered with (its own task_id when it has none)
+    """
+    uniq = dict(zip(task_ids, tasks))
+    ids = sorted(uniq)
+    if not ids:
+        return []
+    grams, offsets = shingles([uniq[task_id] for task_id in ids])
+    labels = lsh_clusters(signatures(grams, offsets), grams, offsets)
+    # ids are sorted, and every root is the smallest index in its cluster
+    cluster_of = {task_id: ids[label] for task_id, label in zip(ids, labels)}
+    return [cluster_of[task_id] for task_id in task_ids]
+
+
+# }}}
+# done.
@@ -0,0 +1,265 @@
+# vim: set ts=4 sts=0 sw=4 si fenc=utf-8 et:
+# vim: set fdm=marker fmr={{{,}}} fdl=0 foldcolumn=4:
+# Authors:     BP
+# =========================================
+"""
+todo query [--tag TAG ...] [--timeline TEXT] [--source TEXT] [--text TEXT]
+           [--due-within DAYS] [--overdue]
+           [--state open|started|completed|all] [--limit N] [--format table|tsv|json]
+todo search TEXT ... [--tag TAG ...] [--state ...] [--limit N] [--format ...]
+todo review --input WRITE_PATH [--tag TAG ...]
+todo start|done TASK_ID ...
+todo changes [--since DATE] [--event KIND ...] [--format ...]
+
+query: lookups against the sqlite index the importer keeps at TASKDIR/tasks.sqlite.
+pandas is never loaded, so answers come back as fast as sqlite can give them
+
+search: ranked full-text search of the same index (task text, tag,
+source path and the note line the task is on; not the rest of the note).
+"quoted phrases", AND/OR/NOT and prefix* work
+
+review: go through the open tasks in WRITE_PATH/<tag>/todo.yml one at a time.
+decisions are only kept in memory until the end of the review (or 'w'),
+then every finished task is moved to todo.done in one batch
+
+start/done: record that tasks (by task_id, or a unique prefix of one)
+were started or finished, in the event log at TASKDIR/events/.
+the index has it right away, the task store on the next import
+
+changes: every event (created, started, updated, completed, moved)
+since DATE (default today), oldest first
+"""
+
+# ---- dependencies {{{
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+from sys import stdout
+
+sys.path.append(str(Path(__file__).resolve().parents[2] / "templates"))
+from collection import commit_done, load_collection
+from taskindex import STATES, connect, find_tasks, index_path, mark, query, search
+from tasklog import EVENTS, append, since
+
+# }}}
+
+TASKDIR = os.environ.get("TODO_TASKDIR", f"{Path.home()}/git/tools/my-TODO/tasks")
+KEYS = "[d]one  [enter] keep  [b]ack  [w]rite and stop  [q]uit without writing"
+
+
+# ---- support methods {{{
+def get_args():
+    parser = argparse.ArgumentParser(prog="todo")
+    parser.add_argument("--taskdir", default=TASKDIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    query_cmd = commands.add_parser("query", help="look up tasks in the index")
+    query_cmd.add_argument("--tag", action="append", default=None)
+    query_cmd.add_argument("--timeline", default=None)
+    query_cmd.add_argument("--source", default=None)
+    query_cmd.add_argument("--text", default=None)
+    query_cmd.add_argument("--state", choices=list(STATES), default="open")
+    query_cmd.add_argument("--limit", type=int, default=None)
+    query_cmd.add_argument("--due-within", type=int, default=None)
+    query_cmd.add_argument("--overdue", action="store_true")
+    query_cmd.add_argument(
+        "--format", choices=["table", "tsv", "json"], default="table"
+    )
+    search_cmd = commands.add_parser("search", help="full-text search of tasks")
+    search_cmd.add_argument("text", nargs="+")
+    search_cmd.add_argument("--tag", action="append", default=None)
+    search_cmd.add_argument("--state", choices=list(STATES), default="all")
+    search_cmd.add_argument("--limit", type=int, default=20)
+    search_cmd.add_argument(
+        "--format", choices=["table", "tsv", "json"], default="table"
+    )
+    review_cmd = commands.add_parser("review", help="mark open tasks as done")
+    review_cmd.add_argument("--input", required=True)
+    review_cmd.add_argument("--tag", action="append", default=None)
+    for name in ("start", "done"):
+        mark_cmd = commands.add_parser(name, help=f"record tasks as {name}")
+        mark_cmd.add_argument("task_id", nargs="+")
+    changes_cmd = commands.add_parser("changes", help="what happened since a date")
+    changes_cmd.add_argument("--since", default=date.today().isoformat())
+    changes_cmd.add_argument("--event", action="append", choices=EVENTS)
+    changes_cmd.add_argument(
+        "--format", choices=["table", "tsv", "json"], default="table"
+    )
+    args = parser.parse_args()
+    if args.command in ("query", "search", "start", "done"):
+        assert Path(index_path(args.taskdir)).exists(), "no index yet, run the import"
+    if args.command == "review":
+        assert Path(args.input).is_dir()
+    return args
+
+
+def show(rows, fmt):
+    if fmt == "json":
+        json.dump(rows, stdout, indent=1)
+        stdout.write("\n")
+        return 1
+    if fmt == "tsv":
+        cols = ["task_id", "form_tag", "timeline", "due", "task", "source", "lineno"]
+        stdout.write("\t".join(cols) + "\n")
+        for row in rows:
+            stdout.write("\t".join(str(row[col] or "") for col in cols) + "\n")
+        return 1
+    width = max([len(row["form_tag"]) for row in rows] or [0])
+    for row in rows:
+        due = f"  (due {row['due']})" if row.get("due") else ""
+        stdout.write(
+            f"{row['form_tag']:<{width}}  {row['task']}{due}"
+            f"  ({row['source']}:{row['lineno']})\n"
+        )
+    return 1
+
+
+def due_range(args):
+    """
+    --due-within N: due from today through N days out, --overdue: due before today,
+    both: anything due by N days out
+    """
+    if (args.due_within is None) and (not args.overdue):
+        return None, None
+    today = date.today()
+    due_from = None if args.overdue else today.isoformat()
+    days = args.due_within if args.due_within is not None else -1
+    return due_from, (today + timedelta(days=days)).isoformat()
+
+
+def run_query(args):
+    conn = connect(index_path(args.taskdir))
+    due_from, due_to = due_range(args)
+    rows = query(
+        conn,
+        tags=args.tag,
+        timeline=args.timeline,
+        source=args.source,
+        text=args.text,
+        state=args.state,
+        limit=args.limit,
+        due_from=due_from,
+        due_to=due_to,
+    )
+    return show(rows, args.format)
+
+
+def run_search(args):
+    conn = connect(index_path(args.taskdir))
+    text = " ".join(args.text)
+    try:
+        rows = search(conn, text, tags=args.tag, state=args.state, limit=args.limit)
+    except sqlite3.OperationalError as err:
+        # a query fts5 can't parse, like one made only of AND/OR/NOT
+        sys.exit(
+            "usage: todo search TEXT ... [--tag TAG ...] [--state ...]\n"
+            f"todo search: error: can't search for '{text}' ({err})"
+        )
+    return show(rows, args.format)
+
+
+def review_items(items, ask=input):
+    """
+    one prompt per item, answers kept in memory.
+    returns (indexes of the items marked done, whether to write them)
+    """
+    done, i = set(), 0
+    stdout.write(f"{len(items)} open tasks. {KEYS}\n")
+    while i < len(items):
+        tag, task = items[i]
+        mark = "x" if i in done else " "
+        try:
+            answer = ask(f"[{mark}] {i + 1}/{len(items)} ({tag}) {task} > ")
+        except EOFError:
+            break
+        answer = answer.strip().lower()
+        if answer == "d":
+            done.add(i)
+        elif answer == "b":
+            i = max(0, i - 1)
+            continue
+        elif answer == "w":
+            break
+        elif answer == "q":
+            return done, False
+        elif answer:
+            done.discard(i)
+        i += 1
+    return done, True
+
+
+def run_review(args):
+    items = load_collection(args.input, tags=args.tag)
+    done, write = review_items(items)
+    if not (write and done):
+        stdout.write("nothing written\n")
+        return 1
+    moved = commit_done(args.input, [items[i] for i in sorted(done)])
+    for tag, n in sorted(moved.items()):
+        stdout.write(f"{n} tasks moved to {tag}/todo.done\n")
+    return 1
+
+
+def run_mark(args):
+    """
+    one event per task, all appended at once; a prefix that matches
+    no task or more than one stops everything before anything is written
+    """
+    conn = connect(index_path(args.taskdir))
+    kind = "started" if args.command == "start" else "completed"
+    found = find_tasks(conn, args.task_id)
+    for prefix, matches in found.items():
+        assert len(matches) == 1, f"{prefix} matches {len(matches)} tasks"
+    tasks = [matches[0] for matches in found.values()]
+    append(
+        args.taskdir,
+        [{"event": kind, "task_id": task_id, "task": task} for task_id, task in tasks],
+    )
+    mark(conn, [task_id for task_id, _ in tasks], kind)
+    for task_id, task in tasks:
+        stdout.write(f"{kind}: {task} ({task_id[:7]})\n")
+    return 1
+
+
+def run_changes(args):
+    events = since(args.taskdir, args.since, kinds=args.event)
+    if args.format == "json":
+        json.dump(events, stdout, indent=1)
+        stdout.write("\n")
+        return 1
+    if args.format == "tsv":
+        cols = ["ts", "event", "task_id", "task", "source", "lineno"]
+        stdout.write("\t".join(cols) + "\n")
+        for event in events:
+            stdout.write("\t".join(str(event.get(col, "")) for col in cols) + "\n")
+        return 1
+    for event in events:
+        where = f"  ({event['source']}:{event['lineno']})" if "source" in event else ""
+        stdout.write(
+            f"{event['ts']}  {event['event']:<9}  "
+            f"{event.get('task', event['task_id'][:7])}{where}\n"
+        )
+    return 1
+
+
+# }}}
+
+# ---- main {{{
+if __name__ == "__main__":
+    args = get_args()
+    if args.command == "query":
+        run_query(args)
+    if args.command == "search":
+        run_search(args)
+    if args.command == "review":
+        run_review(args)
+    if args.command in ("start", "done"):
+        run_mark(args)
+    if args.command == "changes":
+        run_changes(args)
+
+# }}}
+# done.
@@ -6,6 +6,9 @@
 
 
 class Line:
+    # a note can have thousands of these, so no per-instance __dict__
+    __slots__ = ("prefix", "text", "suffix", "next")
+
     def __init__(self, prefix, text, suffix="\n"):
         self.prefix = prefix  # ie. '# '
         self.text = text  # ie. 'Meetings'
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# vim: set ts=4 sts=0 sw=4 si fenc=utf-8 et:
+# vim: set fdm=marker fmr={{{,}}} fdl=0 foldcolumn=4:
+# Authors:     BP
+# =========================================
+
+# dependencies --- {{{
+import re
+import sqlite3
+
+# }}}
+
+# Reminder:
+#     TASKDIR/tasks.sqlite mirrors the live tasks of the store (see taskstore.sync_index),
+# joined back to one row per (task_id, form_tag, timeline); no timeline is stored as ''
+# so the primary key works (NULLs never collide in sqlite)
+COLUMNS = [
+    "task_id",
+    "form_tag",
+    "timeline",
+    "month",
+    "tag",
+    "task",
+    "source",
+    "filename",
+    "lineno",
+    "cell",
+    "TODO_line",
+    "started",
+    "last_update",
+    "completed",
+    "due",
+]
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT NOT NULL,
+    form_tag TEXT NOT NULL,
+    timeline TEXT NOT NULL DEFAULT '',
+    month TEXT,
+    tag TEXT,
+    task TEXT,
+    source TEXT,
+    filename TEXT,
+    lineno INTEGER,
+    cell INTEGER,
+    TODO_line TEXT,
+    started INTEGER,
+    last_update INTEGER,
+    completed INTEGER,
+    due TEXT,
+    PRIMARY KEY (task_id, form_tag, timeline)
+);
+CREATE INDEX IF NOT EXISTS tasks_form_tag ON tasks (form_tag, completed);
+CREATE INDEX IF NOT EXISTS tasks_timeline ON tasks (timeline);
+CREATE INDEX IF NOT EXISTS tasks_source ON tasks (source);
+CREATE INDEX IF NOT EXISTS tasks_state ON tasks (completed, started);
+-- ISO dates, so "due in the next N days" is a range scan of this index
+CREATE INDEX IF NOT EXISTS tasks_due ON tasks (due);
+CREATE INDEX IF NOT EXISTS tasks_open_due ON tasks (completed, due);
+-- the newest part (or base) of each partition already in the tables
+CREATE TABLE IF NOT EXISTS synced (
+    pdir TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL
+);
+"""
+# full-text index over the tasks table (an external-content fts5 table,
+# so the text isn't stored twice), kept current by triggers: the task,
+# its tag, the note's path, and the line of the note it was written on
+# (with its tags and timelines as written). the rest of a note's text
+# never makes it into the store, so it isn't searched.
+# fts5 keeps term positions, which is what makes "phrase queries" work
+FTS_COLUMNS = ["task", "form_tag", "source", "TODO_line"]
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS task_fts USING fts5(
+    task, form_tag, source, TODO_line,
+    content='tasks', content_rowid='rowid', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+    INSERT INTO task_fts (rowid, task, form_tag, source, TODO_line)
+    VALUES (new.rowid, new.task, new.form_tag, new.source, new.TODO_line);
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+    INSERT INTO task_fts (task_fts, rowid, task, form_tag, source, TODO_line)
+    VALUES ('delete', old.rowid, old.task, old.form_tag, old.source, old.TODO_line);
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE ON tasks BEGIN
+    INSERT INTO task_fts (task_fts, rowid, task, form_tag, source, TODO_line)
+    VALUES ('delete', old.rowid, old.task, old.form_tag, old.source, old.TODO_line);
+    INSERT INTO task_fts (rowid, task, form_tag, source, TODO_line)
+    VALUES (new.rowid, new.task, new.form_tag, new.source, new.TODO_line);
+END;
+"""
+DROP_SEARCH = """
+DROP TRIGGER IF EXISTS tasks_fts_insert;
+DROP TRIGGER IF EXISTS tasks_fts_delete;
+DROP TRIGGER IF EXISTS tasks_fts_update;
+DROP TABLE IF EXISTS task_fts;
+"""
+# bm25 weights for task, form_tag, source, TODO_line
+# (the line repeats the task's words, so it counts for little on its own)
+WEIGHTS = (10.0, 2.0, 5.0, 1.0)
+RANK = f"bm25({', '.join(map(str, WEIGHTS))})"
+OPERATORS = {"AND", "OR", "NOT"}
+STATES = {
+    "open": "completed = 0",
+    "started": "started = 1 AND completed = 0",
+    "completed": "completed = 1",
+    "all": "1 = 1",
+}
+
+
+def index_path(taskdir):
+    return f"{taskdir}/tasks.sqlite"
+
+
+def migrate(conn):
+    """
+    an index from before a column was added gets it, and is refilled
+    from the store on the next sync (forgetting what was synced does that)
+    """
+    have = [row[1] for row in conn.execute("PRAGMA table_info(tasks)")]
+    if (not have) or (have == COLUMNS):
+        return 0
+    with conn:
+        for col in COLUMNS:
+            if col not in have:
+                conn.execute(f"ALTER TABLE tasks ADD COLUMN {col}")
+        conn.execute("DELETE FROM synced")
+    return 1
+
+
+def connect(dbpath):
+    conn = sqlite3.connect(dbpath)
+    conn.row_factory = sqlite3.Row
+    migrate(conn)
+    conn.executescript(SCHEMA)
+    # so the REPLACE in INSERT OR REPLACE fires the delete trigger
+    conn.execute("PRAGMA recursive_triggers = ON")
+    has_fts = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'task_fts'"
+    ).fetchone()
+    if has_fts:
+        have = [row[1] for row in conn.execute("PRAGMA table_info(task_fts)")]
+        if have != FTS_COLUMNS:
+            # made before a column was indexed: made again, and rebuilt below
+            conn.executescript(DROP_SEARCH)
+            has_fts = None
+    try:
+        conn.executescript(SEARCH_SCHEMA)
+    except sqlite3.OperationalError:
+        # sqlite built without fts5: everything but search still works
+        return conn
+    if not has_fts:
+        with conn:
+            conn.execute("INSERT INTO task_fts (task_fts) VALUES ('rebuild')")
+    # an index made with other weights gets these
+    rank = conn.execute("SELECT v FROM task_fts_config WHERE k = 'rank'").fetchone()
+    if (not rank) or (rank[0] != RANK):
+        with conn:
+            conn.execute(
+                "INSERT INTO task_fts (task_fts, rank) VALUES ('rank', ?)", (RANK,)
+            )
+    return conn
+
+
+def clear(conn):
+    """
+    empty the index, so the next sync reloads every partition
+    """
+    with conn:
+        conn.execute("DELETE FROM tasks")
+        conn.execute("DELETE FROM synced")
+    return 1
+
+
+def query(
+    conn,
+    tags=None,
+    timeline=None,
+    source=None,
+    text=None,
+    state="open",
+    limit=None,
+    due_from=None,
+    due_to=None,
+):
+    """
+    the lookups the index is for, all answered from the indexes above:
+    `tags` exact (lowercase form_tag), `timeline`/`source`/`text` substrings,
+    `due_from`/`due_to` an inclusive range of ISO dates (soonest first)
+    """
+    where, params = [STATES[state]], []
+    order = "form_tag, source, lineno"
+    if (due_from is not None) or (due_to is not None):
+        where.append("due BETWEEN ? AND ?")
+        params += [
+            due_from if due_from else "0000-00-00",
+            due_to if due_to else "9999-99-99",
+        ]
+        order = "due, form_tag"
+    if tags:
+        where.append(f"form_tag IN ({', '.join('?' * len(tags))})")
+        params += [tag.lower() for tag in tags]
+    for col, value in (("timeline", timeline), ("source", source), ("task", text)):
+        if value:
+            where.append(f"{col} LIKE ?")
+            params.append(f"%{value}%")
+    sql = f"SELECT * FROM tasks WHERE {' AND '.join(where)} ORDER BY {order}"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    rows = [dict(row) for row in conn.execute(sql, params)]
+    for row in rows:
+        row["timeline"] = row["timeline"] if row["timeline"] else None
+    return rows
+
+
+def find_tasks(conn, prefixes):
+    """
+    {prefix: [(task_id, task), ...]} for task_id prefixes, as the
+    tsv/json output shows them (7 characters are usually enough)
+    """
+    found = {}
+    for prefix in prefixes:
+        rows = conn.execute(
+            "SELECT DISTINCT task_id, task FROM tasks WHERE task_id >= ? AND task_id < ?",
+            (prefix, prefix + "\uffff"),
+        )
+        found[prefix] = [tuple(row) for row in rows]
+    return found
+
+
+def mark(conn, task_ids, col):
+    """
+    the index's copy of a state change (`col` one of started/completed),
+    so queries see it before the next import brings it in from the store
+    """
+    with conn:
+        conn.executemany(
+            f"UPDATE tasks SET {col} = 1 WHERE task_id = ?",
+            [(task_id,) for task_id in task_ids],
+        )
+    return 1
+
+
+def match_expr(text):
+    """
+    plain words into an fts5 query: "quoted phrases", AND/OR/NOT and prefix*
+    pass through, every other word is quoted so punctuation (clean.py, 97-106)
+    is searched for instead of parsed
+    """
+    terms = []
+    for term in re.findall(r'"[^"]*"|\S+', text):
+        if term.startswith('"') or (term in OPERATORS):
+            terms.append(term)
+        elif term.endswith("*"):
+            terms.append('"{}"*'.format(term[:-1].replace('"', '""')))
+        else:
+            terms.append('"{}"'.format(term.replace('"', '""')))
+    return " ".join(terms)
+
+
+def search(conn, text, tags=None, state="all", limit=20):
+    """
+    tasks matching `text`, best match first (bm25, the task text weighted most).
+    fts5 picks the top matches itself (ORDER BY rank LIMIT), and only those
+    are joined back to the tasks for the tag/state filters; if the filters
+    leave too few, more matches are fetched. a task under several
+    timelines is returned once
+    """
+    where, params = [STATES[state]], []
+    if tags:
+        where.append(f"tasks.form_tag IN ({', '.join('?' * len(tags))})")
+        params += [tag.lower() for tag in tags]
+    sql = f"""
+        WITH hits AS MATERIALIZED (
+            SELECT rowid, rank FROM task_fts WHERE task_fts MATCH ?
+            ORDER BY rank LIMIT ?
+        )
+        SELECT tasks.*, hits.rank AS score
+        FROM hits JOIN tasks ON tasks.rowid = hits.rowid
+        WHERE {' AND '.join(where)}
+        ORDER BY hits.rank
+    """
+    expr, fetch, total = match_expr(text), limit * 4, None
+    if tags:
+        # narrows the matches inside fts5 already; the exact check is the WHERE
+        quoted = " OR ".join(match_expr(tag.lower()) for tag in tags)
+        expr = f"({expr}) AND (form_tag : ({quoted}))"
+    while True:
+        rows, seen = [], set()
+        for row in conn.execute(sql, [expr, fetch] + params):
+            key = (row["task_id"], row["form_tag"])
+            if key not in seen:
+                seen.add(key)
+                rows.append(dict(row))
+        if len(rows) >= limit:
+            break
+        if total is None:
+            total = conn.execute(
+                "SELECT count(*) FROM task_fts WHERE task_fts MATCH ?", (expr,)
+            ).fetchone()[0]
+        if fetch >= total:
+            break
+        fetch *= 4
+    rows = rows[:limit]
+    for row in rows:
+        row["timeline"] = row["timeline"] if row["timeline"] else None
+    return rows
+
+
+# done.
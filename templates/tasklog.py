@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# vim: set ts=4 sts=0 sw=4 si fenc=utf-8 et:
+# vim: set fdm=marker fmr={{{,}}} fdl=0 foldcolumn=4:
+# Authors:     BP
+# =========================================
+
+# dependencies --- {{{
+import json
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+
+# }}}
+
+# what can happen to a task, and what each does to its state
+# (moved: the TODO line got a new task_id, and it keeps the old one's state;
+# an updated with a "from" is one whose text was edited, which does the same)
+EVENTS = ("created", "started", "updated", "completed", "moved")
+STATE = ["started", "last_update", "completed"]
+SETS = {"started": "started", "updated": "last_update", "completed": "completed"}
+# events between snapshots, and how many snapshots are kept
+SNAPSHOT_EVERY = 10000
+KEEP_SNAPSHOTS = 2
+
+
+# Reminder:
+#     TASKDIR/events/log.jsonl                 one event per line, only ever appended
+#     TASKDIR/events/snapshot-{offset}.json    every task's state as of that byte of the log
+#     TASKDIR/events/applied.json              how far the task store has caught up
+# event = {"ts": "2025-01-08T09:15:02", "event": ..., "task_id": ..., ...}
+# the log is in time order, which is what lets since() binary-search it
+def log_dir(taskdir):
+    return f"{taskdir}/events"
+
+
+def log_path(taskdir):
+    return f"{log_dir(taskdir)}/log.jsonl"
+
+
+def now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def write_json(fname, obj):
+    """
+    temp file + rename, so a reader never sees half a snapshot
+    """
+    tmp = f"{fname}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, fname)
+    return 1
+
+
+def read_json(fname, default):
+    if not Path(fname).exists():
+        return default
+    with open(fname, "r") as f:
+        return json.load(f)
+
+
+def apply_event(tasks, event):
+    task_id, kind = event["task_id"], event["event"]
+    if kind == "created":
+        tasks[task_id] = [False] * len(STATE)
+        return tasks
+    if "from" in event:
+        tasks[task_id] = list(tasks.pop(event["from"], [False] * len(STATE)))
+    if kind in SETS:
+        state = tasks.setdefault(task_id, [False] * len(STATE))
+        state[STATE.index(SETS[kind])] = True
+    return tasks
+
+
+def read_events(taskdir, start=0):
+    """
+    (offset just past the event, event) for every event from byte `start` on
+    """
+    fname = log_path(taskdir)
+    if not Path(fname).exists():
+        return
+    with open(fname, "rb") as f:
+        f.seek(start)
+        offset = start
+        for line in f:
+            offset += len(line)
+            if line.endswith(b"\n"):
+                # a line without its newline is an append still being written
+                yield offset, json.loads(line)
+
+
+def snapshots(taskdir):
+    return sorted(
+        Path(log_dir(taskdir)).glob("snapshot-*.json"),
+        key=lambda path: int(re.findall(r"\d+", path.stem)[-1]),
+    )
+
+
+def current_state(taskdir):
+    """
+    {task_id: [started, last_update, completed]} for every task with events,
+    from the newest snapshot plus the events after it,
+    and the offset of the end of the log
+    """
+    found = snapshots(taskdir)
+    snap = read_json(found[-1], {}) if found else {}
+    tasks, offset = snap.get("tasks", {}), snap.get("offset", 0)
+    for offset, event in read_events(taskdir, offset):
+        apply_event(tasks, event)
+    return tasks, offset
+
+
+def snapshot(taskdir):
+    """
+    materialize the current state, so reading it doesn't replay the whole log
+    """
+    tasks, offset = current_state(taskdir)
+    write_json(
+        f"{log_dir(taskdir)}/snapshot-{offset:012d}.json",
+        {"offset": offset, "ts": now(), "tasks": tasks},
+    )
+    for path in snapshots(taskdir)[:-KEEP_SNAPSHOTS]:
+        path.unlink()
+    return offset
+
+
+def append(taskdir, events):
+    """
+    add `events` (dicts with at least "event" and "task_id") to the log,
+    stamped with the time, in one write; a snapshot is taken
+    once enough events have piled up since the last one
+
+    returns the number of events added
+    """
+    if not events:
+        return 0
+    Path(log_dir(taskdir)).mkdir(parents=True, exist_ok=True)
+    ts = now()
+    lines = "".join(
+        json.dumps({"ts": ts, **event}, separators=(",", ":")) + "\n"
+        for event in events
+    )
+    with open(log_path(taskdir), "a") as f:
+        f.write(lines)
+        f.flush()
+        os.fsync(f.fileno())
+    found = snapshots(taskdir)
+    last = int(re.findall(r"\d+", found[-1].stem)[-1]) if found else 0
+    if sum(1 for _ in read_events(taskdir, last)) >= SNAPSHOT_EVERY:
+        snapshot(taskdir)
+    return len(events)
+
+
+def line_start(f, pos):
+    """
+    where the first line starting at or after `pos` starts
+    """
+    if pos == 0:
+        return 0
+    f.seek(pos - 1)
+    f.readline()
+    return f.tell()
+
+
+def find_offset(taskdir, since):
+    """
+    byte offset of the first event at or after `since` (an ISO date or
+    datetime), by binary search over the log: timestamps only ever grow
+    """
+    fname = log_path(taskdir)
+    if not Path(fname).exists():
+        return 0
+    with open(fname, "rb") as f:
+        lo, hi = 0, f.seek(0, os.SEEK_END)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = line_start(f, mid)
+            if start >= hi:
+                hi = mid
+                continue
+            f.seek(start)
+            line = f.readline()
+            if (not line.endswith(b"\n")) or (json.loads(line)["ts"] >= since):
+                hi = start
+            else:
+                lo = start + len(line)
+    return lo
+
+
+def since(taskdir, when, kinds=None):
+    """
+    the events from `when` on, oldest first; only the tail
+    of the log after `when` is read
+    """
+    return [
+        event
+        for _, event in read_events(taskdir, find_offset(taskdir, when))
+        if (event["ts"] >= when) and ((kinds is None) or (event["event"] in kinds))
+    ]
+
+
+def pending(taskdir):
+    """
+    the state of every task with events the task store hasn't had yet,
+    and the offset to mark as applied once it has
+    """
+    applied = read_json(f"{log_dir(taskdir)}/applied.json", {}).get("offset", 0)
+    touched = {event["task_id"] for _, event in read_events(taskdir, applied)}
+    if not touched:
+        return {}, applied
+    tasks, offset = current_state(taskdir)
+    return {task_id: tasks[task_id] for task_id in touched if task_id in tasks}, offset
+
+
+def mark_applied(taskdir, offset):
+    Path(log_dir(taskdir)).mkdir(parents=True, exist_ok=True)
+    return write_json(f"{log_dir(taskdir)}/applied.json", {"offset": offset})
+
+
+# done.
@@ -0,0 +1,660 @@
+#!/usr/bin/env python3
+# vim: set ts=4 sts=0 sw=4 si fenc=utf-8 et:
+# vim: set fdm=marker fmr={{{,}}} fdl=0 foldcolumn=4:
+# Authors:     BP
+# =========================================
+
+# dependencies --- {{{
+import hashlib
+import operator
+import re
+import shutil
+from pathlib import Path
+
+import pandas as pd
+from fastparquet import ParquetFile
+from taskindex import COLUMNS
+
+# }}}
+
+# three tables, all partitioned the same (optional) way, by the month of the note:
+#     TASKDIR/<table>/[month=<YYYY-MM>/]
+# a TODO line is one row in tasks, plus a row per tag in task_tags
+# and a row per timeline in task_timelines. each table is keyed on these
+TABLES = {
+    "tasks": ["task_id"],
+    "task_tags": ["task_id", "form_tag"],
+    "task_timelines": ["task_id", "timeline"],
+}
+PARTITIONS = ["month"]
+STATE = ["started", "last_update", "completed"]
+FIELDS = {
+    "tasks": ["task_id", "source", "lineno", "cell", "TODO_line", "task"] + STATE,
+    "task_tags": ["task_id", "form_tag", "tag"],
+    "task_timelines": ["task_id", "timeline", "due"],
+}
+# every task from one note repeats its path, so it's kept as a dictionary column
+DICTIONARY = ["source"]
+# the store before it was normalized: TASKDIR/tasks/form_tag=<tag>/[month=]/,
+# one row per (task, timeline) in each tag's partition
+LEGACY_KEYS = ["task_id", "timeline"]
+# and before it was partitioned: TASKDIR/<tag>/, the same rows as base-/part-
+# files, or as one todo.parquet (no task_id) from before there were parts
+TAGDIR_BASE = "todo.parquet"
+# compacted bases are sorted on these, in row groups of this size, so the
+# row-group statistics let a filter on open/due rows skip most of a base
+SORT_BY = ["completed", "due"]
+ROW_GROUP = 1 << 15
+# the comparisons a filter can make besides "in"/"not in"
+COMPARE = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+# Reminder:
+#     PARTITION/base-{seq}.parquet   every live row as of `seq` (written by compact)
+#     PARTITION/part-{seq}.parquet   rows added, changed or retired by one import
+# a row in a later part wins over the same key in an earlier part or the base,
+# and `retired` rows are tombstones for tasks that went away.
+# the partition columns themselves only live in the directory names
+def get_hash(task_str):
+    enc_task = str(task_str).encode()
+    hash_obj = hashlib.sha1(enc_task)
+    return str(hash_obj.hexdigest())
+
+
+def normalize(task):
+    return " ".join(str(task).lower().split())
+
+
+def make_task_id(source, lineno, task, cell=None):
+    """
+    stable as long as the TODO stays on the same line of the same note
+    and its text doesn't change (beyond case/whitespace).
+    in a notebook the line number is within a cell, so the cell is part of it
+    """
+    if (cell is None) or pd.isna(cell):
+        return get_hash(f"{source}:{lineno}:{normalize(task)}")
+    return get_hash(f"{source}:{cell}:{lineno}:{normalize(task)}")
+
+
+def seq_of(path):
+    return int(re.findall(r"\d+", Path(path).stem)[-1])
+
+
+def list_parts(pdir):
+    """
+    the newest base, plus the parts written after it
+    (parts it already covers are ignored even if they haven't been cleaned up yet)
+    """
+    pdir = Path(pdir)
+    bases = sorted(pdir.glob("base-*.parquet"), key=seq_of)
+    base = bases[-1] if bases else None
+    base_seq = seq_of(base) if base else -1
+    parts = [
+        path
+        for path in sorted(pdir.glob("part-*.parquet"), key=seq_of)
+        if seq_of(path) > base_seq
+    ]
+    return base, parts
+
+
+def next_seq(pdir):
+    seqs = [
+        seq_of(path)
+        for path in Path(pdir).glob("*.parquet")
+        if path.stem.startswith(("base-", "part-"))
+    ]
+    return max(seqs) + 1 if seqs else 1
+
+
+def month_of(filename):
+    """
+    notes named like 2025-01-12.md (daily, weekly) get partitioned by that month
+    """
+    found = re.search(r"(\d{4})-(\d{2})", str(filename))
+    return f"{found.group(1)}-{found.group(2)}" if found else "undated"
+
+
+def filename_of(sources):
+    return sources.astype(str).str.rsplit("/", n=1).str[-1]
+
+
+def partition_dir(taskdir, table, month=None):
+    pdir = f"{taskdir}/{table}"
+    return f"{pdir}/month={month}" if month else pdir
+
+
+def table_of(pdir):
+    return next(part for part in reversed(Path(pdir).parts) if part in TABLES)
+
+
+def partition_values(pdir):
+    return dict(
+        part.split("=", 1)
+        for part in Path(pdir).parts
+        if part.split("=")[0] in PARTITIONS
+    )
+
+
+def list_partitions(taskdir, months=None):
+    """
+    partition pruning: the months holding tasks (None for tasks that aren't
+    split by month, which only count when no months were asked for).
+    every table has the same partitions, nothing outside them is opened
+    """
+    root = Path(taskdir, "tasks")
+    found = []
+    if (months is None) and any(root.glob("*.parquet")):
+        found.append(None)
+    for monthdir in sorted(root.glob("month=*")):
+        month = partition_values(monthdir)["month"]
+        if (months is None) or (month in months):
+            found.append(month)
+    return found
+
+
+def encode(df):
+    """
+    the dictionary columns as categoricals: each distinct path is held once,
+    and written to parquet as a dictionary plus small integer codes
+    """
+    return df.astype({col: "category" for col in DICTIONARY if col in df.columns})
+
+
+def keep_rows(df, filters):
+    """
+    the rows of `df` where every filter holds; a null never matches
+    """
+    keep = pd.Series(True, index=df.index)
+    for col, op, value in filters:
+        if op in ("in", "not in"):
+            found = df[col].isin(value)
+            keep &= found if op == "in" else (~found & df[col].notna())
+        else:
+            have = df[col].notna()
+            keep &= have & COMPARE[op](df[col].where(have, value), value)
+    return df.loc[keep]
+
+
+def read_filtered(fname, columns, filters):
+    """
+    one file, with `filters` pushed down to the parquet reader.
+    fastparquet only uses them to skip row groups, so the rows
+    that come back are checked again (keep_rows).
+    a file written before a column existed has it as all nulls:
+    no filter on it matches, and asked for it comes back empty
+    """
+    filters = filters if filters else []
+    names = ParquetFile(fname).columns
+    if any(col not in names for col, _, _ in filters):
+        return None
+    have = None
+    if columns is not None:
+        wanted = dict.fromkeys(columns + [col for col, _, _ in filters])
+        have = [col for col in wanted if col in names]
+    df = pd.read_parquet(fname, columns=have, filters=filters if filters else None)
+    if filters:
+        df = keep_rows(df, filters)
+    return df if columns is None else df.reindex(columns=columns)
+
+
+def read_partition(pdir, columns=None, filters=None, keys=None):
+    """
+    the live rows for one partition of one table: newest version of every key,
+    tombstones dropped. with `columns` only those (plus what's needed to
+    resolve versions) are read.
+    `filters` ([(col, op, value), ...], all must hold) are applied
+    while reading, after the newest version of each key has been worked out
+    from the key columns alone, so an older version can't slip through
+    when the newest one is filtered out
+    """
+    keys = keys if keys else TABLES[table_of(pdir)]
+    base, parts = list_parts(pdir)
+    files = ([base] if base else []) + parts
+    values = partition_values(pdir)
+    empty = FIELDS[table_of(pdir)] if columns is None else columns
+    need = None
+    if columns is not None:
+        need = list(dict.fromkeys(keys + ["seq", "retired"] + columns))
+        need = [col for col in need if col not in values]
+    if not files:
+        return pd.DataFrame(columns=empty)
+    if filters:
+        versions = pd.concat(
+            pd.read_parquet(f, columns=keys + ["seq", "retired"]) for f in files
+        ).sort_values("seq", kind="stable")
+        versions = versions.drop_duplicates(subset=keys, keep="last")
+        versions = versions.loc[~versions.retired.astype(bool), keys + ["seq"]]
+        dfs = [read_filtered(f, need, filters) for f in files]
+        dfs = [df for df in dfs if (df is not None) and (not df.empty)]
+        if not dfs:
+            return pd.DataFrame(columns=empty)
+        df = pd.concat(dfs).merge(versions, on=keys + ["seq"], how="inner")
+    else:
+        df = pd.concat([read_filtered(f, need, None) for f in files])
+        df = df.sort_values("seq", kind="stable")
+        df = df.drop_duplicates(subset=keys, keep="last")
+        df = df.loc[~df.retired.astype(bool)]
+    df = df.drop(columns="retired").assign(**values).reset_index(drop=True)
+    df = encode(df)
+    return df if columns is None else df.reindex(columns=columns)
+
+
+def join_tables(tasks, tags, timelines=None, how="left"):
+    """
+    back to one row per (task, tag, timeline), the shape consumers (and the
+    sqlite index) see. with how="left" a task without a timeline is one row
+    with none, with how="inner" it's left out
+    """
+    out = tasks.merge(tags.drop(columns=PARTITIONS, errors="ignore"), on="task_id")
+    if timelines is None:
+        return out
+    timelines = timelines.drop(columns=PARTITIONS, errors="ignore")
+    return out.merge(timelines, on="task_id", how=how)
+
+
+def read_tasks(taskdir, columns=None, tags=None, months=None, filters=None):
+    """
+    the reader for everything downstream of import, one row per
+    (task, tag, timeline). only the tables that `columns`, `filters` and
+    `tags` touch are read and joined: `tags` are looked up in task_tags
+    first and only those tasks are read, `months` prune partitions,
+    and each filter is pushed down to the parquet reads of the table that has
+    its column (see read_partition). a filter on a timeline column
+    leaves out the tasks without one
+    """
+    filters = filters if filters else []
+
+    def wanted(col):
+        return (columns is None) or (col in columns)
+
+    def cols_of(table):
+        return ["task_id"] + [col for col in FIELDS[table][1:] if wanted(col)]
+
+    def filters_of(table):
+        return [f for f in filters if f[0] in FIELDS[table]]
+
+    use_tags = (
+        bool(tags)
+        or any(wanted(col) for col in FIELDS["task_tags"][1:])
+        or bool(filters_of("task_tags"))
+    )
+    use_timelines = any(wanted(col) for col in FIELDS["task_timelines"][1:]) or bool(
+        filters_of("task_timelines")
+    )
+    task_cols = cols_of("tasks") + [
+        col for col in ["source", "month"] if wanted(col) or wanted("filename")
+    ]
+    task_cols = list(dict.fromkeys(task_cols))
+    dfs = []
+    for month in list_partitions(taskdir, months=months):
+        ids = None
+        tag_df, timeline_df = None, None
+        if use_tags:
+            tag_filters = filters_of("task_tags")
+            if tags:
+                tag_filters = tag_filters + [("form_tag", "in", list(tags))]
+            tag_df = read_partition(
+                partition_dir(taskdir, "task_tags", month),
+                columns=cols_of("task_tags"),
+                filters=tag_filters,
+            )
+            ids = set(tag_df.task_id) if tags else None
+        if use_timelines:
+            timeline_df = read_partition(
+                partition_dir(taskdir, "task_timelines", month),
+                columns=cols_of("task_timelines"),
+                filters=filters_of("task_timelines"),
+            )
+            if filters_of("task_timelines"):
+                found = set(timeline_df.task_id)
+                ids = found if ids is None else ids & found
+        task_filters = filters_of("tasks")
+        if ids is not None:
+            if not ids:
+                continue
+            task_filters = task_filters + [("task_id", "in", sorted(ids))]
+        df = read_partition(
+            partition_dir(taskdir, "tasks", month),
+            columns=task_cols,
+            filters=task_filters,
+        )
+        if df.empty:
+            continue
+        if use_tags:
+            df = join_tables(df, tag_df)
+        if use_timelines:
+            how = "inner" if filters_of("task_timelines") else "left"
+            df = df.merge(timeline_df, on="task_id", how=how)
+        dfs.append(df)
+    if not dfs:
+        return pd.DataFrame(columns=columns)
+    out = pd.concat(dfs).reset_index(drop=True)
+    if wanted("filename"):
+        out["filename"] = filename_of(out.source)
+    return encode(out) if columns is None else encode(out.reindex(columns=columns))
+
+
+def upsert(pdir, rows, retired_ids):
+    """
+    merge freshly scanned `rows` into one partition of one table.
+    tasks that already exist keep their started/last_update/completed state,
+    rows identical to what's stored aren't written again,
+    and stored rows of `retired_ids` (tasks from a re-scanned or deleted note)
+    that didn't come back get a tombstone.
+    only the difference is written, as one new part
+
+    returns (n_written, n_retired)
+    """
+    keys = TABLES[table_of(pdir)]
+    live = read_partition(pdir)
+    seq = next_seq(pdir)
+    rows = rows.drop(columns=PARTITIONS, errors="ignore")
+    live = live.drop(columns=PARTITIONS, errors="ignore")
+    state = [col for col in STATE if col in rows.columns]
+    data = [col for col in rows.columns if col not in state]
+    # columns added to the importer after this partition was first written
+    for col in data:
+        if col not in live.columns:
+            live[col] = pd.Series(pd.NA, index=live.index, dtype=rows[col].dtype)
+    if live.empty:
+        changed = rows
+        gone = live
+    else:
+        incoming = rows.drop(columns=state)
+        if state:
+            incoming = incoming.merge(live[keys + state], on=keys, how="left")
+            incoming[state] = incoming[state].fillna(False)
+        same = incoming[data].merge(
+            live[data].drop_duplicates(), on=data, how="left", indicator=True
+        )
+        changed = incoming.loc[(same._merge != "both").values]
+        found = live[keys].merge(
+            incoming[keys].drop_duplicates(), on=keys, how="left", indicator=True
+        )
+        gone = live.loc[
+            ((found._merge == "left_only").values)
+            & live.task_id.isin(retired_ids).values
+        ]
+    delta = [
+        df
+        for df in (
+            changed.assign(retired=False),
+            gone.drop(columns="seq", errors="ignore").assign(retired=True),
+        )
+        if not df.empty
+    ]
+    if delta:
+        Path(pdir).mkdir(parents=True, exist_ok=True)
+        encode(pd.concat(delta).assign(seq=seq)).to_parquet(
+            f"{pdir}/part-{seq:06d}.parquet", index=False
+        )
+    return changed.shape[0], gone.shape[0]
+
+
+def set_state(pdir, states):
+    """
+    put the lifecycle state from the event log (see tasklog.py),
+    {task_id: [started, last_update, completed]}, on the tasks it names in
+    one partition of the tasks table. only rows whose state differs are
+    written, as one new part
+
+    returns the number of rows written
+    """
+    if not states:
+        return 0
+    live = read_partition(pdir, filters=[("task_id", "in", sorted(states))])
+    if live.empty:
+        return 0
+    live = live.drop(columns=PARTITIONS + ["seq"], errors="ignore")
+    new = pd.DataFrame([states[task_id] for task_id in live.task_id], columns=STATE)
+    old = live[STATE].fillna(False).astype(bool).values
+    changed = (old != new.values).any(axis=1)
+    if not changed.any():
+        return 0
+    rows = live.loc[changed].reset_index(drop=True)
+    rows[STATE] = new.loc[changed].reset_index(drop=True)
+    seq = next_seq(pdir)
+    encode(rows.assign(retired=False, seq=seq)).to_parquet(
+        f"{pdir}/part-{seq:06d}.parquet", index=False
+    )
+    return rows.shape[0]
+
+
+def compact(pdir):
+    """
+    fold the base and all parts into a new base of only the live rows.
+    the new base is in place before anything is removed,
+    and list_parts ignores whatever it covers, so a crash here loses nothing
+    """
+    if not list_parts(pdir)[1]:
+        return 0
+    live = read_partition(pdir).drop(columns=PARTITIONS, errors="ignore")
+    live = live.sort_values(
+        [col for col in SORT_BY if col in live.columns], kind="stable"
+    )
+    seq = next_seq(pdir) - 1
+    encode(live.assign(retired=False)).to_parquet(
+        f"{pdir}/base-{seq:06d}.parquet",
+        index=False,
+        engine="fastparquet",
+        row_group_offsets=ROW_GROUP,
+    )
+    for path in Path(pdir).glob("*.parquet"):
+        if (seq_of(path) < seq) or path.stem.startswith("part-"):
+            path.unlink()
+    return 1
+
+
+def count_parts(pdir):
+    return len(list_parts(pdir)[1])
+
+
+def tag_files(tagdir):
+    """
+    the files the store kept in one TASKDIR/<tag>/ (the todo.yml and todo.done
+    kept next to them by hand are not its to touch)
+    """
+    tagdir = Path(tagdir)
+    found = sorted(tagdir.glob("base-*.parquet")) + sorted(
+        tagdir.glob("part-*.parquet")
+    )
+    return found + [path for path in [tagdir / TAGDIR_BASE] if path.exists()]
+
+
+def tag_dirs(taskdir):
+    """
+    TASKDIR/<tag>/ for every tag of a store from before it was partitioned
+    """
+    return [
+        path
+        for path in sorted(Path(taskdir).iterdir())
+        if path.is_dir() and (path.name not in TABLES) and tag_files(path)
+    ]
+
+
+def find_lineno(rows):
+    """
+    line numbers for rows of a todo.parquet from before they were kept:
+    the first line of the note that reads just like the row's TODO_line,
+    <NA> when the note is gone or that line has changed since
+    """
+    lines = {}
+    for source in rows.source.unique():
+        lines[source] = {}
+        try:
+            with open(source, "r", errors="replace") as f:
+                for lineno, line in enumerate(f, start=1):
+                    lines[source].setdefault(line, lineno)
+        except OSError:
+            continue
+    return pd.array(
+        [lines[source].get(line) for source, line in zip(rows.source, rows.TODO_line)],
+        dtype="Int64",
+    )
+
+
+def read_tag_dir(tagdir):
+    """
+    the live rows of one TASKDIR/<tag>/: newest version of every
+    (task_id, timeline), tombstones dropped. until there's a base- file,
+    a todo.parquet is the base, and its rows get their task_id here
+    """
+    base, parts = list_parts(tagdir)
+    if (not base) and Path(tagdir, TAGDIR_BASE).exists():
+        base = Path(tagdir, TAGDIR_BASE)
+    dfs = [pd.read_parquet(f) for f in ([base] if base else []) + parts]
+    if not dfs:
+        return None
+    if "task_id" not in dfs[0].columns:
+        old = dfs[0]
+        if "lineno" not in old.columns:
+            old["lineno"] = find_lineno(old)
+        old["task_id"] = [
+            make_task_id(source, line, task)
+            for source, line, task in zip(old.source, old.lineno, old.task)
+        ]
+        dfs[0] = old.assign(seq=0, retired=False)
+    df = pd.concat(dfs).sort_values("seq", kind="stable")
+    df = df.drop_duplicates(subset=LEGACY_KEYS, keep="last")
+    return df.loc[~df.retired.astype(bool)].reindex(
+        columns=list(dict.fromkeys(list(df.columns) + STATE))
+    )
+
+
+def read_legacy(taskdir):
+    """
+    every live row of a store from before the tables were split
+    (or from before it was partitioned at all), or None when there isn't one
+    """
+    dfs = []
+    for tagdir in sorted(Path(taskdir, "tasks").glob("form_tag=*")):
+        form_tag = tagdir.name.split("=", 1)[1]
+        pdirs = [tagdir] if any(tagdir.glob("*.parquet")) else []
+        for pdir in pdirs + sorted(tagdir.glob("month=*")):
+            df = read_partition(pdir, keys=LEGACY_KEYS)
+            dfs.append(df.assign(form_tag=form_tag))
+    for tagdir in tag_dirs(taskdir):
+        df = read_tag_dir(tagdir)
+        dfs += [] if df is None else [df.assign(form_tag=tagdir.name)]
+    return pd.concat(dfs).reset_index(drop=True) if dfs else None
+
+
+def split_rows(df):
+    """
+    one row per (task, tag, timeline), as the legacy store has them,
+    into the three tables. a task's state is whatever any of its rows says
+    """
+    df = df.assign(**{col: df[col].fillna(False).astype(bool) for col in STATE})
+    state = df.groupby("task_id", sort=False)[STATE].max().reset_index()
+    tasks = df.drop_duplicates(subset="task_id").reindex(columns=FIELDS["tasks"])
+    tasks = tasks.drop(columns=STATE).merge(state, on="task_id")
+    tags = df.drop_duplicates(subset=TABLES["task_tags"])
+    timelines = df.loc[df.timeline.notna()]
+    timelines = timelines.drop_duplicates(subset=TABLES["task_timelines"])
+    return {
+        "tasks": encode(tasks).reset_index(drop=True),
+        "task_tags": tags.reindex(columns=FIELDS["task_tags"]).reset_index(drop=True),
+        "task_timelines": timelines.reindex(
+            columns=FIELDS["task_timelines"]
+        ).reset_index(drop=True),
+    }
+
+
+def drop_legacy(taskdir):
+    """
+    the legacy store's files, once they've been moved over. a TASKDIR/<tag>/
+    only goes with them if nothing else was kept in it
+    """
+    for tagdir in Path(taskdir, "tasks").glob("form_tag=*"):
+        shutil.rmtree(tagdir)
+    for tagdir in tag_dirs(taskdir):
+        for path in tag_files(tagdir):
+            path.unlink()
+        if not any(tagdir.iterdir()):
+            tagdir.rmdir()
+    return 1
+
+
+def index_rows(df, values):
+    """
+    store rows as plain python tuples in taskindex.COLUMNS order
+    """
+    df = df.assign(filename=filename_of(df.source), **values).reindex(columns=COLUMNS)
+    df["timeline"] = df.timeline.fillna("")
+    df = df.astype(object).where(df.notna(), None)
+    return list(df.itertuples(index=False, name=None))
+
+
+def read_joined(taskdir, month, filters=None):
+    tables = {
+        table: read_partition(partition_dir(taskdir, table, month), filters=filters)
+        for table in TABLES
+    }
+    return join_tables(tables["tasks"], tables["task_tags"], tables["task_timelines"])
+
+
+def sync_index(conn, taskdir, month=None):
+    """
+    bring the sqlite index (see taskindex.py) up to date with one partition
+    by replaying the parts written since it was last synced: every task
+    they touch (in any table) is deleted from the index and its joined
+    rows put back. if parts have already been compacted away, or the
+    partition was never synced, its rows are all reloaded instead
+
+    returns the number of parts (or bases) applied
+    """
+    suffix = f"/month={month}" if month else ""
+    todo, rebuild, newest = [], False, {}
+    for table in TABLES:
+        row = conn.execute(
+            "SELECT seq FROM synced WHERE pdir = ?", (table + suffix,)
+        ).fetchone()
+        applied = row[0] if row else 0
+        base, parts = list_parts(partition_dir(taskdir, table, month))
+        files = ([base] if base else []) + parts
+        newest[table] = max([seq_of(path) for path in files] or [0])
+        if newest[table] <= applied:
+            continue
+        if (row is None) or (base and (seq_of(base) > applied)):
+            rebuild = True
+        todo += [path for path in parts if seq_of(path) > applied]
+    if (not rebuild) and (not todo):
+        return 0
+    values = {"month": month}
+    marks = ", ".join("?" * len(COLUMNS))
+    upsert_sql = f"INSERT OR REPLACE INTO tasks VALUES ({marks})"
+    with conn:
+        if rebuild:
+            conn.execute("DELETE FROM tasks WHERE month IS ?", (month,))
+            conn.executemany(
+                upsert_sql, index_rows(read_joined(taskdir, month), values)
+            )
+        else:
+            ids = sorted(
+                set().union(
+                    *(
+                        pd.read_parquet(path, columns=["task_id"]).task_id
+                        for path in todo
+                    )
+                )
+            )
+            conn.executemany(
+                "DELETE FROM tasks WHERE task_id = ?", ((task_id,) for task_id in ids)
+            )
+            rows = read_joined(taskdir, month, filters=[("task_id", "in", ids)])
+            conn.executemany(upsert_sql, index_rows(rows, values))
+        conn.executemany(
+            "INSERT OR REPLACE INTO synced VALUES (?, ?)",
+            [(table + suffix, seq) for table, seq in newest.items() if seq],
+        )
+    return 1 if rebuild else len(todo)
+
+
+# done.
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# vim: set ts=4 sts=0 sw=4 si fenc=utf-8 et:
+# vim: set fdm=marker fmr={{{,}}} fdl=0 foldcolumn=4:
+# Authors:     BP
+# =========================================
+
+# dependencies --- {{{
+import calendar
+import re
+from datetime import date, timedelta
+from functools import lru_cache
+
+# }}}
+
+# what the timeline's first word does to the date it names
+OFFSETS = {"by": 0, "on": 0, "before": -1}
+WEEKDAYS = {
+    name: i
+    for i, names in enumerate(
+        [
+            ["mon", "monday"],
+            ["tue", "tues", "tuesday"],
+            ["wed", "weds", "wednesday"],
+            ["thu", "thur", "thurs", "thursday"],
+            ["fri", "friday"],
+            ["sat", "saturday"],
+            ["sun", "sunday"],
+        ]
+    )
+    for name in names
+}
+MONTHS = {
+    name.lower(): i
+    for i in range(1, 13)
+    for name in (calendar.month_name[i], calendar.month_abbr[i])
+}
+RELATIVE = {"today": 0, "tonight": 0, "eod": 0, "tomorrow": 1, "tmrw": 1}
+END_OF_WEEK = {"eow", "end of week", "end of the week"}
+END_OF_MONTH = {"eom", "end of month", "end of the month"}
+# times of day are dropped, a date is as precise as this gets
+TIME = re.compile(r"\d{1,2}(:\d{2})?(am|pm)|\d{1,2}:\d{2}|noon|morning|afternoon")
+ISO = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})")
+SLASHED = re.compile(r"(\d{1,2})/(\d{1,2})(?:/(\d{2}|\d{4}))?")
+
+
+# Reminder:
+#     resolve("by friday", date(2025, 1, 8)) -> date(2025, 1, 10)
+#     resolve("before 3/1", date(2025, 1, 8)) -> date(2025, 2, 28)
+def date_of(filename):
+    """
+    the date a note is about, from its name (daily/weekly notes are 2025-01-08.md)
+    """
+    found = ISO.search(str(filename))
+    if not found:
+        return None
+    try:
+        return date(*map(int, found.groups()))
+    except ValueError:
+        return None
+
+
+def next_weekday(ref, weekday, skip=False):
+    days = (weekday - ref.weekday()) % 7
+    return ref + timedelta(days=days + (7 if skip else 0))
+
+
+def in_year(ref, month, day, year=None):
+    """
+    a month/day without a year is the next one on or after the note's date
+    """
+    try:
+        if year is not None:
+            return date(year + 2000 if year < 100 else year, month, day)
+        if ref is None:
+            return None
+        when = date(ref.year, month, day)
+        return when if when >= ref else date(ref.year + 1, month, day)
+    except ValueError:
+        return None
+
+
+def parse_when(text, ref):
+    found = ISO.fullmatch(text)
+    if found:
+        return in_year(ref, int(found[2]), int(found[3]), int(found[1]))
+    found = SLASHED.fullmatch(text)
+    if found:
+        year = int(found[3]) if found[3] else None
+        return in_year(ref, int(found[1]), int(found[2]), year)
+    if ref is None:
+        return None
+    if text in RELATIVE:
+        return ref + timedelta(days=RELATIVE[text])
+    if text in END_OF_WEEK:
+        return next_weekday(ref, WEEKDAYS["fri"])
+    if text in END_OF_MONTH:
+        return date(ref.year, ref.month, calendar.monthrange(ref.year, ref.month)[1])
+    words = text.split()
+    if words == ["next", "week"]:
+        return next_weekday(ref, WEEKDAYS["fri"], skip=True)
+    if (len(words) == 2) and (words[0] in ("next", "this")) and (words[1] in WEEKDAYS):
+        return next_weekday(ref, WEEKDAYS[words[1]], skip=words[0] == "next")
+    if (len(words) == 1) and (words[0] in WEEKDAYS):
+        return next_weekday(ref, WEEKDAYS[words[0]])
+    if len(words) == 2:
+        month, day = words if words[0] in MONTHS else words[::-1]
+        if (month in MONTHS) and day.rstrip("stndrh").isdigit():
+            return in_year(ref, MONTHS[month], int(day.rstrip("stndrh")))
+    return None
+
+
+@lru_cache(maxsize=1 << 14)
+def resolve(timeline, ref=None):
+    """
+    the due date a timeline marker ("by friday", "before 3/1", "on 2025-03-04")
+    means, counted from `ref`, the date of the note it was written in.
+    None when it can't be worked out (or needs a `ref` that isn't known).
+    the same phrases come back note after note, so answers are memoized
+    """
+    if not timeline:
+        return None
+    words = timeline.lower().replace(",", " ").split()
+    if (not words) or (words[0] not in OFFSETS):
+        return None
+    rest = " ".join(word for word in words[1:] if not TIME.fullmatch(word))
+    when = parse_when(rest, ref)
+    if when is None:
+        return None
+    return when + timedelta(days=OFFSETS[words[0]])
+
+
+def due_of(timeline, filename):
+    """
+    resolve() for a TODO found in the note `filename`, as an ISO date (sorts as text)
+    """
+    if not isinstance(timeline, str):
+        return None
+    due = resolve(timeline, date_of(filename))
+    return due.isoformat() if due else None
+
+
+# done.